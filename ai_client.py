@@ -1,123 +1,859 @@
-import json
 import asyncio
-from typing import Dict, List, Any, Optional
-import httpx
+import contextlib
+import contextvars
+import copy
+import random
+import time
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple, AsyncIterator
 import os
 from dotenv import load_dotenv
 from dashscope import Application
 from http import HTTPStatus
 
+from llm_executor import BoundedThreadPool, PoolSaturatedError
+from dashscope_http import DashScopeHTTPTransport, DashScopeAPIError, DEFAULT_BASE_URL
+from llm_credentials import CredentialPool, Credential, TierRouter
+from llm_cache import ResultCache, DiskCache, CacheKey, make_cache_key
+from llm_control import (
+    SingleFlight, LatencyTracker, HedgedRunner, AdaptiveTimeout, UpstreamTimeoutError,
+    CircuitBreaker, CircuitOpenError,
+    AdmissionController, AdmissionRejectedError
+)
+from json_stream import JSONStreamScanner, extract_json_checked
+from timetable import slice_timetable, stitch_segments
+from place_names import PlaceNameIndex
+from llm_prompts import (
+    SEARCH_TRAINS, ROUTE_RECOMMENDATIONS, ROUTE_STATIONS, ROUTE_BUNDLE,
+    ROUTE_STATIONS_COMPACT, ROUTE_BUNDLE_COMPACT, TRAIN_TIMETABLE, TRAIN_TIMETABLE_SKELETON,
+    TIMETABLE_HUBS, TIMETABLE_SEGMENT, TIMETABLE_SEGMENT_SKELETON,
+    CITY_CONTENT, TRAVEL_TIPS,
+    PromptUsage, expand_station, expand_stations
+)
+
 load_dotenv()
 
+# 当前请求返回的是否为降级数据（超出时间预算、调用失败或无法解析），值为原因
+_degraded_reason: contextvars.ContextVar = contextvars.ContextVar("ai_degraded_reason", default=None)
+# 当前LLM调用所属的方法，用于准入控制按接口统计
+_call_label: contextvars.ContextVar = contextvars.ContextVar("ai_call_label", default="default")
+# 当前LLM调用的调度优先级: interactive(用户请求)、prefetch(预取)、refresh(缓存刷新)
+_call_priority: contextvars.ContextVar = contextvars.ContextVar("ai_call_priority", default="interactive")
+# 当前所在的合并请求共享任务的键，任务内的LLM调用按所有等待者中最高的优先级调度
+_call_flight: contextvars.ContextVar = contextvars.ContextVar("ai_call_flight", default=None)
+# 当前请求的截止时间(事件循环时间)，组合多个LLM调用的方法在这个时间内完成所有回退
+_call_deadline: contextvars.ContextVar = contextvars.ContextVar("ai_call_deadline", default=None)
+
 class AlibabaAIClient:
     """阿里百炼API客户端 - 使用Application.call方式"""
     
     def __init__(self):
         self.api_key = os.getenv("ALIBABA_DASHSCOPE_API_KEY")
         self.app_id = os.getenv("ALIBABA_DASHSCOPE_APP_ID")
+
+        # 凭据池: 多组API密钥/应用ID按权重分摊调用，未配置时只使用上面的一组
+        self.credentials = CredentialPool.from_config(
+            os.getenv("ALIBABA_DASHSCOPE_CREDENTIALS"),
+            self.api_key,
+            self.app_id,
+            eject_seconds=float(os.getenv("ALIBABA_AI_CREDENTIAL_EJECT_SECONDS", "30")),
+            max_eject_seconds=float(os.getenv("ALIBABA_AI_CREDENTIAL_MAX_EJECT_SECONDS", "300"))
+        )
+        if len(self.credentials) and (not self.api_key or not self.app_id):
+            self.api_key = self.credentials.credentials[0].api_key
+            self.app_id = self.credentials.credentials[0].app_id
+
+        # 模型档位: 每个档位对应一组配置了不同模型的应用，按方法选择档位，首选档位变慢时自动改道
+        tier_pools = {"default": self.credentials}
+        for tier in filter(None, (name.strip().lower() for name in os.getenv("ALIBABA_AI_TIERS", "").split(","))):
+            pool = CredentialPool.from_config(
+                os.getenv(f"ALIBABA_DASHSCOPE_CREDENTIALS_{tier.upper()}"),
+                None,
+                None,
+                eject_seconds=self.credentials.eject_seconds,
+                max_eject_seconds=self.credentials.max_eject_seconds
+            )
+            if len(pool):
+                tier_pools[tier] = pool
+            else:
+                print(f"⚠️  模型档位 {tier} 未配置凭据，已忽略")
+        bundle_tier = os.getenv("ALIBABA_AI_TIER_ROUTE_BUNDLE", "default").lower()
+        self.router = TierRouter(
+            tier_pools,
+            method_tiers={
+                "search_trains": os.getenv("ALIBABA_AI_TIER_SEARCH_TRAINS", "default").lower(),
+                "get_route_recommendations": os.getenv("ALIBABA_AI_TIER_ROUTE_RECOMMENDATIONS", "default").lower(),
+                "get_route_stations": os.getenv("ALIBABA_AI_TIER_ROUTE_STATIONS", "default").lower(),
+                "get_route_bundle": bundle_tier,
+                "stream_route_bundle": bundle_tier
+            },
+            latency_threshold=float(os.getenv("ALIBABA_AI_TIER_LATENCY_THRESHOLD", "0")),
+            percentile=float(os.getenv("ALIBABA_AI_TIER_LATENCY_PERCENTILE", "95")),
+            failure_rate=float(os.getenv("ALIBABA_AI_TIER_FAILURE_RATE", "0.5"))
+        )
         
         if not self.api_key:
             print("⚠️  未找到阿里百炼API密钥，将使用模拟数据")
         if not self.app_id:
             print("⚠️  未找到阿里百炼应用ID，将使用模拟数据")
 
+        # 调用后端: sdk 使用dashscope SDK, httpx 使用共享连接池直接请求应用接口
+        self.backend = os.getenv("ALIBABA_AI_BACKEND", "sdk").lower()
+        self.http_transport = None
+        if self.backend == "httpx":
+            self.http_transport = DashScopeHTTPTransport(
+                base_url=os.getenv("DASHSCOPE_BASE_URL", DEFAULT_BASE_URL),
+                http2=os.getenv("ALIBABA_AI_HTTP2", "true").lower() == "true",
+                max_connections=int(os.getenv("ALIBABA_AI_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("ALIBABA_AI_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("ALIBABA_AI_KEEPALIVE_EXPIRY", "60"))
+            )
+
+        # 提示词: inline 每次发送完整的说明和格式要求; app 表示说明已配置在百炼应用的系统提示词中，只发送任务名和变量
+        self.prompt_instructions = os.getenv("ALIBABA_AI_PROMPT_CONTEXT", "inline").lower() != "app"
+        self.prompt_usage = PromptUsage()
+        # 紧凑输出: 站点由模型以定长数组输出，减少输出token，服务端还原为原有字段
+        self.compact_stations = os.getenv("ALIBABA_AI_COMPACT_STATIONS", "true").lower() == "true"
+
+        # 执行模式(仅sdk后端): threadpool 在有界线程池中运行SDK调用, inline 直接在事件循环中调用
+        self.execution_mode = os.getenv("ALIBABA_AI_EXECUTION_MODE", "threadpool").lower()
+        self.executor = None
+        if self.backend == "sdk" and self.execution_mode == "threadpool":
+            self.executor = BoundedThreadPool(
+                max_workers=int(os.getenv("ALIBABA_AI_POOL_SIZE", "8")),
+                max_queue=int(os.getenv("ALIBABA_AI_POOL_QUEUE", "64"))
+            )
+
+        # 结果缓存: 同一车次/区间的生成结果在TTL内直接复用
+        self.cache = None
+        if os.getenv("ALIBABA_AI_CACHE_ENABLED", "true").lower() == "true":
+            self.cache = ResultCache(
+                ttls={
+                    "search_trains": float(os.getenv("ALIBABA_AI_CACHE_TTL_SEARCH_TRAINS", "600")),
+                    "get_route_recommendations": float(os.getenv("ALIBABA_AI_CACHE_TTL_ROUTE_RECOMMENDATIONS", "86400")),
+                    "get_route_stations": float(os.getenv("ALIBABA_AI_CACHE_TTL_ROUTE_STATIONS", "86400")),
+                    "get_route_bundle": float(os.getenv("ALIBABA_AI_CACHE_TTL_ROUTE_BUNDLE", "86400")),
+                    "get_train_timetable": float(os.getenv("ALIBABA_AI_CACHE_TTL_TIMETABLE", "604800")),
+                    "route_content": float(os.getenv("ALIBABA_AI_CACHE_TTL_ROUTE_CONTENT", "604800")),
+                    "get_city_content": float(os.getenv("ALIBABA_AI_CACHE_TTL_CITY_CONTENT", "2592000")),
+                    "get_travel_tips": float(os.getenv("ALIBABA_AI_CACHE_TTL_TRAVEL_TIPS", "604800"))
+                },
+                max_entries=int(os.getenv("ALIBABA_AI_CACHE_MAX_ENTRIES", "2048")),
+                max_bytes=int(os.getenv("ALIBABA_AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                soft_ratio=float(os.getenv("ALIBABA_AI_CACHE_SOFT_TTL_RATIO", "0.75")),
+                refresh_jitter=float(os.getenv("ALIBABA_AI_CACHE_REFRESH_JITTER", "0.1"))
+            )
+
+        # 失败结果缓存: 调用失败或无法解析时，返回的降级数据按短TTL缓存，相同请求在此期间不再调用上游；
+        # 同一个键连续失败时TTL翻倍，直到上限
+        self.negative_cache = None
+        self.negative_ttl = float(os.getenv("ALIBABA_AI_NEGATIVE_CACHE_TTL", "60"))
+        self.negative_max_ttl = float(os.getenv("ALIBABA_AI_NEGATIVE_CACHE_MAX_TTL", "900"))
+        if os.getenv("ALIBABA_AI_NEGATIVE_CACHE_ENABLED", "true").lower() == "true" and self.negative_ttl > 0:
+            self.negative_cache = ResultCache(
+                ttls={},
+                default_ttl=self.negative_ttl,
+                max_entries=int(os.getenv("ALIBABA_AI_NEGATIVE_CACHE_MAX_ENTRIES", "512"))
+            )
+
+        # 过期前刷新: 软过期的条目照常返回，同时在后台以refresh优先级重新生成，同一个键只刷新一次
+        self.refresh_delay = float(os.getenv("ALIBABA_AI_CACHE_REFRESH_DELAY", "2"))
+        self._refreshing: Dict[CacheKey, asyncio.Task] = {}
+        self.refresh_stats = {"scheduled": 0, "completed": 0, "failed": 0}
+        # 未启用请求合并时，调用方超出时间预算后仍在后台运行的调用
+        self._detached_loads: set = set()
+
+        # 地名规范化: 北京南站/北京南/Beijing South 等写法在构建缓存键前映射为同一规范名称；
+        # 提示词使用原始输入，返回数据中的起终点换回本次请求的写法（命中其他写法写入的缓存时也一样）
+        self.place_names = None
+        if os.getenv("ALIBABA_AI_PLACE_NAME_NORMALIZATION", "true").lower() == "true":
+            self.place_names = PlaceNameIndex.from_file(os.getenv("ALIBABA_AI_PLACE_ALIASES_FILE") or None)
+
+        # 持久化缓存: 内存缓存之后的SQLite层，保存路线和站点数据，重启后仍可命中
+        self.disk_cache = None
+        self.disk_cache_methods = (
+            "get_route_recommendations", "get_route_stations", "get_route_bundle", "get_train_timetable",
+            "route_content", "get_city_content", "get_travel_tips"
+        )
+        if os.getenv("ALIBABA_AI_DISK_CACHE_ENABLED", "true").lower() == "true":
+            default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "route_cache", "llm_results.sqlite3")
+            try:
+                self.disk_cache = DiskCache(
+                    path=os.getenv("ALIBABA_AI_DISK_CACHE_PATH", default_path),
+                    max_bytes=int(os.getenv("ALIBABA_AI_DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+                    flush_interval=float(os.getenv("ALIBABA_AI_DISK_CACHE_FLUSH_INTERVAL", "2"))
+                )
+            except Exception as e:
+                print(f"⚠️  持久化缓存初始化失败，仅使用内存缓存: {e}")
+
+        # 全程时刻表: 按车次缓存全程停靠站，站点信息由时刻表切片得到，同一车次的不同区间只调用一次LLM
+        self.timetable_slicing = os.getenv("ALIBABA_AI_TIMETABLE_SLICING", "true").lower() == "true"
+        # 分段生成: 停靠站较多的车次先取枢纽站，再按枢纽站分段并发生成，耗时取决于最长的一段
+        self.timetable_segments = os.getenv("ALIBABA_AI_TIMETABLE_SEGMENTS", "false").lower() == "true"
+        self.timetable_segment_min_stops = int(os.getenv("ALIBABA_AI_TIMETABLE_SEGMENT_MIN_STOPS", "20"))
+        self.timetable_segment_max = int(os.getenv("ALIBABA_AI_TIMETABLE_SEGMENT_MAX", "4"))
+
+        # 城市内容片段: 路线综合数据由时刻表切片加上按城市缓存的景点美食拼成，缺少的城市并发生成
+        # 冷启动时一次选择需要 1次时刻表 + 1次贴士 + 每个未缓存城市1次调用，默认关闭，保持一次选择一次LLM调用
+        self.city_fragments = os.getenv("ALIBABA_AI_CITY_FRAGMENTS", "false").lower() == "true"
+        self.city_fragments_concurrency = int(os.getenv("ALIBABA_AI_CITY_FRAGMENTS_CONCURRENCY", "4"))
+
+        # 路线综合数据: 路线推荐和站点信息由同一次LLM调用生成，旧接口返回其投影
+        self.route_bundle_projection = os.getenv("ALIBABA_AI_ROUTE_BUNDLE_PROJECTION", "true").lower() == "true"
+
+        # 请求合并: 相同缓存键的并发调用共享同一次LLM请求
+        self.singleflight = None
+        if os.getenv("ALIBABA_AI_SINGLEFLIGHT_ENABLED", "true").lower() == "true":
+            self.singleflight = SingleFlight(on_escalate=self._promote_flight)
+
+        # 自适应超时: 按档位和方法统计成功调用耗时，超时取 p99×倍数+余量，限制在上下限之间
+        self.upstream_timeouts = None
+        if os.getenv("ALIBABA_AI_ADAPTIVE_TIMEOUT_ENABLED", "true").lower() == "true":
+            self.upstream_timeouts = AdaptiveTimeout(
+                floor=float(os.getenv("ALIBABA_AI_TIMEOUT_FLOOR", "10")),
+                ceiling=float(os.getenv("ALIBABA_AI_TIMEOUT_CEILING", "90")),
+                default=float(os.getenv("ALIBABA_AI_TIMEOUT_DEFAULT", "60")),
+                percentile=float(os.getenv("ALIBABA_AI_TIMEOUT_PERCENTILE", "99")),
+                multiplier=float(os.getenv("ALIBABA_AI_TIMEOUT_MULTIPLIER", "1.5")),
+                headroom=float(os.getenv("ALIBABA_AI_TIMEOUT_HEADROOM", "2"))
+            )
+
+        # 熔断器: 上游错误率或慢调用率过高时暂停调用，直接返回缓存或本地数据
+        self.breaker = None
+        if os.getenv("ALIBABA_AI_BREAKER_ENABLED", "true").lower() == "true":
+            self.breaker = CircuitBreaker(
+                failure_rate=float(os.getenv("ALIBABA_AI_BREAKER_FAILURE_RATE", "0.5")),
+                slow_call_rate=float(os.getenv("ALIBABA_AI_BREAKER_SLOW_RATE", "0.8")),
+                slow_call_threshold=float(os.getenv("ALIBABA_AI_BREAKER_SLOW_SECONDS", "20")),
+                window_size=int(os.getenv("ALIBABA_AI_BREAKER_WINDOW", "20")),
+                min_calls=int(os.getenv("ALIBABA_AI_BREAKER_MIN_CALLS", "10")),
+                open_duration=float(os.getenv("ALIBABA_AI_BREAKER_OPEN_SECONDS", "30")),
+                half_open_probes=int(os.getenv("ALIBABA_AI_BREAKER_PROBES", "2"))
+            )
+        self.short_circuited: Dict[str, int] = {}
+
+        # 准入控制: 限制同时进行的LLM调用数，排队已满或等待超时直接拒绝(503)
+        # 用户请求优先调度，预取和刷新等后台任务只能占用各自份额内的名额
+        self.admission = None
+        if os.getenv("ALIBABA_AI_ADMISSION_ENABLED", "true").lower() == "true":
+            self.admission = AdmissionController(
+                max_concurrency=int(os.getenv("ALIBABA_AI_MAX_CONCURRENCY", "16")),
+                max_queue=int(os.getenv("ALIBABA_AI_ADMISSION_QUEUE", "64")),
+                queue_timeout=float(os.getenv("ALIBABA_AI_ADMISSION_QUEUE_TIMEOUT", "5")),
+                retry_after=int(os.getenv("ALIBABA_AI_RETRY_AFTER", "2")),
+                shares={
+                    "prefetch": float(os.getenv("ALIBABA_AI_PREFETCH_SHARE", "0.25")),
+                    "refresh": float(os.getenv("ALIBABA_AI_REFRESH_SHARE", "0.25"))
+                }
+            )
+
+        # 时间预算(秒): 超出后返回缓存/本地/模拟数据并标记为降级，0表示不限制
+        self.latency_budgets = {
+            "search_trains": float(os.getenv("ALIBABA_AI_BUDGET_SEARCH_TRAINS", "10")),
+            "get_route_recommendations": float(os.getenv("ALIBABA_AI_BUDGET_ROUTE_RECOMMENDATIONS", "20")),
+            "get_route_stations": float(os.getenv("ALIBABA_AI_BUDGET_ROUTE_STATIONS", "20")),
+            "get_route_bundle": float(os.getenv("ALIBABA_AI_BUDGET_ROUTE_BUNDLE", "25")),
+            "get_train_timetable": float(os.getenv("ALIBABA_AI_BUDGET_TIMETABLE", "25")),
+            "get_city_content": float(os.getenv("ALIBABA_AI_BUDGET_CITY_CONTENT", "15")),
+            "get_travel_tips": float(os.getenv("ALIBABA_AI_BUDGET_TRAVEL_TIPS", "15"))
+        }
+        self.deadline_fallbacks: Dict[str, int] = {}
+
+        # 对冲请求: 调用耗时超过历史分位仍未返回时再发一次，取先返回的结果
+        self.latency_tracker = LatencyTracker()
+        self.hedger = None
+        if os.getenv("ALIBABA_AI_HEDGE_ENABLED", "true").lower() == "true":
+            self.hedger = HedgedRunner(
+                self.latency_tracker,
+                percentile=float(os.getenv("ALIBABA_AI_HEDGE_PERCENTILE", "95")),
+                min_delay=float(os.getenv("ALIBABA_AI_HEDGE_MIN_DELAY", "1")),
+                default_delay=float(os.getenv("ALIBABA_AI_HEDGE_DEFAULT_DELAY", "8"))
+            )
+
+    async def startup(self):
+        """应用启动时调用：预热到百炼的连接"""
+        if self.http_transport and self.api_key and self.app_id:
+            await self.http_transport.start()
+
+    async def shutdown(self):
+        """应用关闭时调用：释放连接池和线程池"""
+        for task in list(self._refreshing.values()) + list(self._detached_loads):
+            task.cancel()
+        if self.http_transport:
+            await self.http_transport.close()
+        if self.executor:
+            self.executor.shutdown()
+        if self.disk_cache:
+            self.disk_cache.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回客户端运行指标"""
+        return {
+            "backend": self.backend,
+            "execution_mode": self.execution_mode if self.backend == "sdk" else None,
+            "executor": self.executor.stats() if self.executor else None,
+            "http_transport": self.http_transport.stats() if self.http_transport else None,
+            "prompt_usage": self.prompt_usage.stats(),
+            "cache": self.cache.stats() if self.cache else None,
+            "disk_cache": self.disk_cache.stats() if self.disk_cache else None,
+            "cache_refresh": dict(self.refresh_stats, in_flight=len(self._refreshing)),
+            "negative_cache": self.negative_cache.stats() if self.negative_cache else None,
+            "place_names": self.place_names.stats() if self.place_names else None,
+            "singleflight": self.singleflight.stats() if self.singleflight else None,
+            "latency": self.latency_tracker.stats(),
+            "hedging": self.hedger.stats() if self.hedger else None,
+            "latency_budgets": dict(self.latency_budgets),
+            "deadline_fallbacks": dict(self.deadline_fallbacks),
+            "upstream_timeouts": self.upstream_timeouts.stats() if self.upstream_timeouts else None,
+            "circuit_breaker": self.breaker.stats() if self.breaker else None,
+            "short_circuited": dict(self.short_circuited),
+            "admission": self.admission.stats() if self.admission else None,
+            "tiers": self.router.stats()
+        }
+
+    def degraded_reason(self) -> Optional[str]:
+        """当前请求中返回降级数据的原因，正常时为None"""
+        return _degraded_reason.get()
+
+    def _mark_degraded(self, reason: str) -> None:
+        _degraded_reason.set(reason)
+
+    def _current_priority(self) -> str:
+        """当前LLM调用的调度优先级；在合并请求的共享任务中取所有等待者中最高的优先级"""
+        flight = _call_flight.get()
+        if flight is not None and self.singleflight:
+            return self.singleflight.priority(flight) or _call_priority.get()
+        return _call_priority.get()
+
+    def _promote_flight(self, key: CacheKey, priority_class: str) -> None:
+        """更高优先级的调用方加入合并请求时，提升共享任务中正在排队的LLM调用"""
+        if self.admission is not None:
+            self.admission.promote(key, priority_class)
+
+    @contextlib.contextmanager
+    def priority(self, priority_class: str):
+        """在此范围内发起的LLM调用使用指定的调度优先级，供预取、缓存刷新等后台任务使用"""
+        token = _call_priority.set(priority_class)
+        try:
+            yield
+        finally:
+            _call_priority.reset(token)
+
+    @contextlib.contextmanager
+    def _deadline(self, method: str):
+        """在此范围内的LLM调用共用方法的时间预算，已有更早的截止时间时沿用"""
+        budget = self.latency_budgets.get(method, 0)
+        deadline = _call_deadline.get()
+        if budget > 0:
+            own = asyncio.get_running_loop().time() + budget
+            deadline = own if deadline is None else min(deadline, own)
+        token = _call_deadline.set(deadline)
+        try:
+            yield
+        finally:
+            _call_deadline.reset(token)
+
+    def _budget_for(self, method: str) -> float:
+        """方法的时间预算，不超过当前请求剩余的时间；0表示不限制"""
+        budget = self.latency_budgets.get(method, 0)
+        deadline = _call_deadline.get()
+        if deadline is None:
+            return budget
+        remaining = max(deadline - asyncio.get_running_loop().time(), 0.001)
+        return min(budget, remaining) if budget > 0 else remaining
+
+    def _place_name(self, name: Optional[str]) -> str:
+        """缓存键和时刻表切片使用的规范地名"""
+        if self.place_names is None:
+            return (name or '').strip()
+        return self.place_names.canonical(name)
+
+    def _route_cache_key(self, method: str, train_info: Dict[str, Any]) -> CacheKey:
+        """根据train_info构建缓存键"""
+        return make_cache_key(
+            method,
+            train_no=train_info.get('train_no'),
+            from_station=self._place_name(train_info.get('from_station')),
+            to_station=self._place_name(train_info.get('to_station')),
+            departure_date=train_info.get('departure_date')
+        )
+
+    @staticmethod
+    def _with_request_names(data: Any, train_info: Dict[str, Any]) -> Any:
+        """把路线数据中 route_info/train_info 的起终点换成本次请求的写法
+
+        缓存键按规范地名构建，“Beijing South”可能命中“北京南站”写入的结果；返回的都是副本，可以直接修改。
+        """
+        if not isinstance(data, dict):
+            return data
+        for field in ('route_info', 'train_info'):
+            info = data.get(field)
+            if not isinstance(info, dict):
+                continue
+            for name in ('from_station', 'to_station'):
+                if train_info.get(name):
+                    info[name] = train_info[name]
+        return data
+
+    async def _cache_lookup(self, key: CacheKey) -> Optional[Any]:
+        """依次查内存缓存和持久化缓存，持久化缓存在线程池中查询"""
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        # 内存未命中时查持久化缓存，命中后按原过期时间回填内存，软过期时间也从原写入时间算起
+        if self.disk_cache is not None and key[0] in self.disk_cache_methods:
+            stored = await self.disk_cache.get_async(key)
+            if stored is not None:
+                value, expires_at = stored
+                if self.cache:
+                    self.cache.set(key, value, expires_at=expires_at)
+                return value
+        
+        return None
+
+    def _cache_store(self, key: CacheKey, result: Any) -> None:
+        """写入内存缓存和持久化缓存"""
+        method = key[0]
+        if self.cache:
+            self.cache.set(key, result)
+        if self.disk_cache is not None and method in self.disk_cache_methods:
+            ttl = self.cache.ttl_for(method) if self.cache else 86400
+            self.disk_cache.set(key, result, ttl)
+
+    async def _cached_call(
+        self,
+        key: CacheKey,
+        fetch: Callable[[], Awaitable[Tuple[Any, bool]]],
+        fallback: Callable[[], Any]
+    ) -> Any:
+        """先查结果缓存，未命中时调用fetch；fetch返回(结果, 是否可缓存)
+
+        不可缓存时第二项可以是降级原因字符串(如 "truncated")，为False时原因记为 "unparseable"。
+        超出方法的时间预算时不再等待，返回过期缓存或fallback()并标记为降级；
+        后台的调用仍会继续，完成后照常写入缓存。
+        最近失败过的请求直接返回当时缓存的降级数据。
+        """
+        method = key[0]
+        cached = await self._cache_lookup(key)
+        if cached is not None:
+            if self.cache and self.cache.needs_refresh(key):
+                self._schedule_refresh(key, fetch)
+            return cached
+        
+        negative = self.negative_cache.get(key) if self.negative_cache else None
+        if negative is not None:
+            self._mark_degraded(negative['reason'])
+            return negative['result']
+        _call_label.set(method)
+        
+        # 熔断期间不等待上游，直接使用过期缓存或本地数据
+        if self.breaker and not self.breaker.allows_requests():
+            return await self._short_circuit(key, fallback)
+        
+        call = self._load(key, fetch, fallback)
+        
+        budget = self._budget_for(method)
+        try:
+            if budget > 0:
+                result, cacheable = await asyncio.wait_for(call, budget)
+            else:
+                result, cacheable = await call
+        except asyncio.TimeoutError:
+            self.deadline_fallbacks[method] = self.deadline_fallbacks.get(method, 0) + 1
+            print(f"⚠️  {method} 超出时间预算{budget:.1f}秒，返回降级数据")
+            self._mark_degraded("deadline")
+            stale = await self._cache_lookup_stale(key)
+            return stale if stale is not None else fallback()
+        except CircuitOpenError:
+            return await self._short_circuit(key, fallback)
+        except (AdmissionRejectedError, PoolSaturatedError):
+            raise
+        except Exception as e:
+            # 与失败结果缓存中保存的内容一致：优先返回过期的真实数据
+            print(f"⚠️  {method} 调用失败，返回降级数据: {e}")
+            self._mark_degraded("error")
+            stale = await self._cache_lookup_stale(key)
+            return stale if stale is not None else fallback()
+        
+        if cacheable is not True:
+            self._mark_degraded(self._uncacheable_reason(cacheable))
+        # 每个调用方拿到独立副本，避免互相修改共享结果
+        return copy.deepcopy(result) if self.singleflight else result
+
+    @staticmethod
+    def _uncacheable_reason(cacheable: Any) -> str:
+        """fetch返回不可缓存时的降级原因"""
+        return cacheable if isinstance(cacheable, str) else "unparseable"
+
+    def _load(
+        self,
+        key: CacheKey,
+        fetch: Callable[[], Awaitable[Tuple[Any, bool]]],
+        fallback: Optional[Callable[[], Any]] = None
+    ) -> Awaitable[Tuple[Any, bool]]:
+        """调用fetch并写入缓存；启用请求合并时并发的相同请求共享结果
+
+        给出fallback时，失败或无法解析的结果写入失败结果缓存（后台刷新不传fallback，失败时保留原有缓存）。
+        """
+        method = key[0]
+        
+        async def load():
+            if self.singleflight:
+                _call_flight.set(key)
+            try:
+                if self.hedger:
+                    result, cacheable = await self.hedger.run(method, fetch)
+                else:
+                    result, cacheable = await fetch()
+            except (AdmissionRejectedError, CircuitOpenError, PoolSaturatedError):
+                # 过载和熔断与具体请求无关，不记为该请求的失败
+                raise
+            except Exception:
+                if fallback is not None:
+                    # 有过期的真实数据时优先缓存它，而不是模拟数据
+                    stale = await self._cache_lookup_stale(key)
+                    self._store_negative(key, stale if stale is not None else fallback(), "error")
+                raise
+            if cacheable is True:
+                self._cache_store(key, result)
+                if self.negative_cache:
+                    self.negative_cache.invalidate(key)
+            elif fallback is not None and cacheable != "partial":
+                # 部分片段缺失的结果本身有效，缺失的片段已各自记录失败，下次请求直接重新拼装
+                self._store_negative(key, result, self._uncacheable_reason(cacheable))
+            return result, cacheable
+        
+        if self.singleflight:
+            return self.singleflight.do(key, load, label=method, priority=self._current_priority())
+        # 与请求合并一样放到独立任务中，调用方超时放弃等待时不取消调用，完成后照常写入缓存
+        task = asyncio.ensure_future(load())
+        self._detached_loads.add(task)
+        task.add_done_callback(self._detached_load_done)
+        return asyncio.shield(task)
+
+    def _detached_load_done(self, task: asyncio.Task) -> None:
+        self._detached_loads.discard(task)
+        # 调用方已放弃等待时，避免出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def _store_negative(self, key: CacheKey, result: Any, reason: str) -> None:
+        """按短TTL缓存降级结果，同一个键连续失败时TTL翻倍"""
+        if self.negative_cache is None:
+            return
+        previous = self.negative_cache.get_stale(key)
+        failures = previous['failures'] + 1 if previous else 1
+        ttl = min(self.negative_max_ttl, self.negative_ttl * 2 ** (failures - 1))
+        self.negative_cache.set(key, {"reason": reason, "result": result, "failures": failures}, ttl=ttl)
+
+    def _schedule_refresh(self, key: CacheKey, fetch: Callable[[], Awaitable[Tuple[Any, bool]]]) -> None:
+        """后台刷新软过期的缓存条目，同一个键同时只有一个刷新任务"""
+        if key in self._refreshing:
+            return
+        if self.breaker and not self.breaker.allows_requests():
+            return
+        
+        async def refresh():
+            # 随机延迟，避免同时软过期的条目同时刷新
+            await asyncio.sleep(random.uniform(0, self.refresh_delay))
+            _call_label.set(key[0])
+            with self.priority("refresh"):
+                try:
+                    _, cacheable = await self._load(key, fetch)
+                    self.refresh_stats["completed" if cacheable is True else "failed"] += 1
+                except Exception as e:
+                    self.refresh_stats["failed"] += 1
+                    print(f"⚠️  后台刷新缓存失败({key[0]}): {e}")
+                finally:
+                    self._refreshing.pop(key, None)
+        
+        self.refresh_stats["scheduled"] += 1
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def _short_circuit(self, key: CacheKey, fallback: Callable[[], Any]) -> Any:
+        """熔断时的降级返回"""
+        method = key[0]
+        self.short_circuited[method] = self.short_circuited.get(method, 0) + 1
+        self._mark_degraded("circuit_open")
+        stale = await self._cache_lookup_stale(key)
+        return stale if stale is not None else fallback()
+
+    async def _cache_lookup_stale(self, key: CacheKey) -> Optional[Any]:
+        """降级时查找已过期但尚未淘汰的缓存"""
+        if self.cache:
+            stale = self.cache.get_stale(key)
+            if stale is not None:
+                return stale
+        if self.disk_cache is not None and key[0] in self.disk_cache_methods:
+            stored = await self.disk_cache.get_async(key, allow_stale=True)
+            if stored is not None:
+                return stored[0]
+        return None
+
     async def get_route_recommendations(self, train_info: Dict[str, Any]) -> Dict[str, Any]:
         """根据火车信息获取沿途推荐"""
         try:
-            # 构建提示词
-            prompt = self._build_route_prompt(train_info)
-            
             # 如果没有配置API密钥或应用ID，使用模拟数据
             if not self.api_key or not self.app_id:
                 return self._get_mock_route_data(train_info)
             
-            # 调用阿里百炼API
-            response_text = await self._call_api(prompt)
+            # 由路线综合数据投影得到，与站点信息共用一次LLM调用
+            if self.route_bundle_projection:
+                return self._project_route_recommendations(await self.get_route_bundle(train_info))
             
-            # 解析响应
-            return self._parse_response(response_text, train_info)
+            async def fetch():
+                # 构建提示词
+                prompt = self._build_route_prompt(train_info)
+                
+                # 调用阿里百炼API
+                response_text = await self._call_api(prompt)
+                
+                # 解析响应，无法解析时的基本结构和截断修复的结果不进入缓存
+                route_data, complete = self._parse_route_json(response_text)
+                if route_data is None:
+                    return self._create_basic_structure(response_text, train_info), False
+                return route_data, True if complete else "truncated"
+            
+            route_data = await self._cached_call(
+                self._route_cache_key("get_route_recommendations", train_info), fetch,
+                lambda: self._get_mock_route_data(train_info)
+            )
+            return self._with_request_names(route_data, train_info)
             
+        except AdmissionRejectedError:
+            # 负载过高时交给接口层返回503，不用模拟数据顶替
+            raise
         except Exception as e:
             print(f"获取路线推荐时出错: {e}")
+            self._mark_degraded("error")
             return self._get_mock_route_data(train_info)
 
     def _build_route_prompt(self, train_info: Dict[str, Any]) -> str:
         """构建发送给AI的提示词"""
-        from_station = train_info.get('from_station', '未知')
-        to_station = train_info.get('to_station', '未知')
-        train_no = train_info.get('train_no', '未知')
-        
-        prompt = f"""请为我推荐从{from_station}到{to_station}的{train_no}次列车沿途的风景名胜和特色美食。
-
-要求：
-1. 推荐3-5个沿途主要城市或景点
-2. 每个地点包括：景点名称、特色美食、简短描述
-3. 返回JSON格式，结构如下：
-{{
-  "route_info": {{
-    "train_no": "{train_no}",
-    "from_station": "{from_station}",
-    "to_station": "{to_station}",
-    "travel_time": "约X小时"
-  }},
-  "attractions": [
-    {{
-      "city": "城市名",
-      "scenic_spots": ["景点1", "景点2"],
-      "local_food": ["美食1", "美食2"],
-      "description": "简短描述"
-    }}
-  ],
-  "travel_tips": ["贴士1", "贴士2"]
-}}
-
-请确保返回有效的JSON格式。"""
-
-        return prompt
+        return ROUTE_RECOMMENDATIONS.render(
+            self.prompt_instructions,
+            train_no=train_info.get('train_no', '未知'),
+            from_station=train_info.get('from_station', '未知'),
+            to_station=train_info.get('to_station', '未知')
+        )
 
     async def _call_api(self, prompt: str) -> str:
         """调用阿里百炼API"""
+        # 熔断器打开时直接抛出CircuitOpenError，不等待上游
+        probe = self.breaker.acquire() if self.breaker else False
+        started = time.monotonic()
         try:
-            # 使用Application.call方式调用
-            response = Application.call(
-                api_key=self.api_key,
-                app_id=self.app_id,
-                prompt=prompt
-            )
-            
-            # 检查响应状态
-            if response.status_code != HTTPStatus.OK:
-                print(f"百炼API错误: {response.status_code} {getattr(response, 'message', '')}")
-                raise Exception(f"API调用失败: {response.status_code}")
+            async with self._admit():
+                started = time.monotonic()
+                reply = await self._call_upstream(prompt)
             
-            # 提取回复文本
-            reply = getattr(response.output, 'text', '') if hasattr(response, 'output') else ''
             reply = reply.replace('*', '')  # 清理格式字符
             
-            return reply
-            
+        except (asyncio.CancelledError, PoolSaturatedError, AdmissionRejectedError):
+            # 被取消、本地线程池已满或排队被拒绝不代表上游故障
+            if self.breaker:
+                self.breaker.release(probe)
+            raise
         except Exception as e:
+            if self.breaker:
+                self.breaker.record(probe, False, time.monotonic() - started)
             print(f"调用阿里百炼API失败: {e}")
             raise
+        
+        if self.breaker:
+            self.breaker.record(probe, True, time.monotonic() - started)
+        return reply
 
-    def _parse_response(self, response_text: str, train_info: Dict[str, Any]) -> Dict[str, Any]:
-        """解析AI响应"""
+    async def _stream_api(self, prompt: str) -> AsyncIterator[str]:
+        """以增量输出方式调用阿里百炼API，逐段产出回复文本"""
+        probe = self.breaker.acquire() if self.breaker else False
+        started = time.monotonic()
         try:
-            # 尝试直接解析JSON
-            if response_text.strip().startswith('{'):
-                return json.loads(response_text)
-            
-            # 如果不是JSON格式，尝试提取JSON部分
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            
-            # 如果无法解析为JSON，构建基本结构
-            return self._create_basic_structure(response_text, train_info)
-            
-        except json.JSONDecodeError:
-            return self._create_basic_structure(response_text, train_info)
+            async with self._admit():
+                started = time.monotonic()
+                async for text in self._stream_upstream(prompt):
+                    yield text
+        except (asyncio.CancelledError, GeneratorExit, PoolSaturatedError, AdmissionRejectedError):
+            if self.breaker:
+                self.breaker.release(probe)
+            raise
+        except Exception:
+            if self.breaker:
+                self.breaker.record(probe, False, time.monotonic() - started)
+            raise
+        if self.breaker:
+            self.breaker.record(probe, True, time.monotonic() - started)
+
+    async def _call_upstream(self, prompt: str) -> str:
+        """按方法选择模型档位，从该档位的凭据池选择一组凭据调用上游；被限流时换一组凭据重试一次"""
+        tier = self.router.choose(_call_label.get())
+        pool = self.router.pool(tier)
+        timeout_label = f"{tier}/{_call_label.get()}"
+        attempts = 2 if len(pool) > 1 else 1
+        for attempt in range(attempts):
+            credential = pool.acquire()
+            started = time.monotonic()
+            try:
+                reply = await self._request_with_timeout(credential, prompt, timeout_label)
+            except Exception as e:
+                throttled = pool.release(credential, e)
+                if throttled and attempt + 1 < attempts:
+                    continue
+                # 超时和上游错误也是档位的样本，否则卡住的档位耗时分位一直很低，不会被绕开
+                self.router.record(tier, time.monotonic() - started, ok=False)
+                raise
+            except BaseException:
+                pool.release(credential)
+                raise
+            pool.release(credential)
+            elapsed = time.monotonic() - started
+            self.router.record(tier, elapsed)
+            if self.upstream_timeouts:
+                self.upstream_timeouts.record(timeout_label, elapsed)
+            return reply
+
+    async def _request_with_timeout(self, credential: Credential, prompt: str, timeout_label: str) -> str:
+        """按后端类型调用上游，超过自适应超时时间时放弃等待
+
+        超时时间同时交给HTTP客户端和SDK，让线程池中的阻塞调用按时结束，wait_for只作兜底。
+        """
+        timeout = self.upstream_timeouts.timeout_for(timeout_label) if self.upstream_timeouts else None
+        if self.http_transport:
+            request = self._call_http(prompt, credential, timeout)
+        else:
+            request = self._call_sdk(prompt, credential, timeout)
+        
+        if timeout is None:
+            return await request
+        
+        try:
+            return await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            self.upstream_timeouts.record_timeout(timeout_label)
+            raise UpstreamTimeoutError(f"{timeout_label} 调用超过{timeout:.1f}秒未返回")
+
+    async def _call_http(self, prompt: str, credential: Credential, timeout: Optional[float] = None) -> str:
+        """通过共享连接池调用百炼应用接口，返回回复文本"""
+        body = await self.http_transport.complete(credential.api_key, credential.app_id, prompt, timeout=timeout)
+        self.prompt_usage.record(_call_label.get(), prompt, body.get('usage'))
+        return (body.get('output') or {}).get('text', '') or ''
+
+    def _admit(self):
+        """占用一个LLM并发名额，未启用准入控制时不做限制"""
+        if self.admission is None:
+            return contextlib.nullcontext()
+        return self.admission.slot(_call_label.get(), self._current_priority(), tag=_call_flight.get())
+
+    async def _stream_upstream(self, prompt: str) -> AsyncIterator[str]:
+        """按档位和凭据池选择凭据，产出增量回复文本"""
+        pool = self.router.pool(self.router.choose(_call_label.get()))
+        credential = pool.acquire()
+        error = None
+        try:
+            async for text in self._stream_with(credential, prompt):
+                yield text
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            pool.release(credential, error)
+
+    async def _stream_with(self, credential: Credential, prompt: str) -> AsyncIterator[str]:
+        """使用指定凭据产出增量回复文本"""
+        if self.http_transport:
+            async for text in self.http_transport.stream(credential.api_key, credential.app_id, prompt):
+                yield text.replace('*', '')
+            return
+        
+        # SDK的流式结果是阻塞迭代器，在线程中消费并通过队列交给事件循环
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        
+        def produce():
+            try:
+                responses = Application.call(
+                    api_key=credential.api_key,
+                    app_id=credential.app_id,
+                    prompt=prompt,
+                    stream=True,
+                    incremental_output=True
+                )
+                for response in responses:
+                    if response.status_code != HTTPStatus.OK:
+                        raise DashScopeAPIError(response.status_code, getattr(response, 'message', '') or '')
+                    text = getattr(response.output, 'text', '') if hasattr(response, 'output') else ''
+                    if text:
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+        
+        if self.executor:
+            producer = asyncio.ensure_future(self.executor.run(produce))
+        else:
+            producer = loop.run_in_executor(None, produce)
+        
+        getter = None
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    # 生产者已结束但没有送出结束标记（提交被拒绝、排队时被丢弃或线程中出错），
+                    # 取出已入队的文本后不再等待
+                    getter.cancel()
+                    while not queue.empty():
+                        text = queue.get_nowait()
+                        if text is finished:
+                            break
+                        yield text.replace('*', '')
+                    break
+                text = getter.result()
+                if text is finished:
+                    break
+                yield text.replace('*', '')
+        finally:
+            if getter is not None and not getter.done():
+                getter.cancel()
+        
+        # 把线程中的异常抛给调用方
+        await producer
+
+    async def _call_sdk(self, prompt: str, credential: Credential, timeout: Optional[float] = None) -> str:
+        """通过dashscope SDK调用，返回回复文本"""
+        options = {"request_timeout": timeout} if timeout is not None else {}
+        # 使用Application.call方式调用，SDK是阻塞的，默认放到线程池中执行
+        if self.executor:
+            response = await self.executor.run(
+                Application.call,
+                api_key=credential.api_key,
+                app_id=credential.app_id,
+                prompt=prompt,
+                **options
+            )
+        else:
+            response = Application.call(
+                api_key=credential.api_key,
+                app_id=credential.app_id,
+                prompt=prompt,
+                **options
+            )
+        
+        # 检查响应状态
+        if response.status_code != HTTPStatus.OK:
+            print(f"百炼API错误: {response.status_code} {getattr(response, 'message', '')}")
+            raise DashScopeAPIError(response.status_code, getattr(response, 'message', '') or '')
+        
+        self.prompt_usage.record(_call_label.get(), prompt, getattr(response, 'usage', None))
+        
+        # 提取回复文本
+        return getattr(response.output, 'text', '') if hasattr(response, 'output') else ''
+
+    def _parse_route_json(self, response_text: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """从AI响应中解析路线JSON，返回(路线数据, 是否完整)，失败时路线数据为None"""
+        route_data, complete = extract_json_checked(response_text)
+        return (route_data, complete) if isinstance(route_data, dict) else (None, False)
 
     def _create_basic_structure(self, text: str, train_info: Dict[str, Any]) -> Dict[str, Any]:
         """当无法解析JSON时，创建基本结构"""
@@ -193,76 +929,49 @@ class AlibabaAIClient:
             if not self.api_key or not self.app_id:
                 return self._get_mock_trains()
             
-            # 构建查询车次的提示词
-            prompt = f"""请帮我查询{departure_date}从{origin}到{destination}的火车车次信息。
-
-要求：
-1. 列出3-8个不同时间段的车次选项
-2. 包含高铁、动车、普通列车等不同类型
-3. 返回JSON格式，包含以下字段：
-   - train_number: 车次号
-   - departure_time: 发车时间 
-   - arrival_time: 到达时间
-   - duration: 运行时长
-   - price: 票价
-   - train_type: 车型(如：高速动车、动车、普快等)
-
-返回格式：
-[
-  {{
-    "train_number": "G1",
-    "departure_time": "08:30",
-    "arrival_time": "14:25",
-    "duration": "5小时55分",
-    "price": "553元",
-    "train_type": "高速动车"
-  }}
-]
-
-请确保返回有效的JSON数组格式。"""
+            async def fetch():
+                # 构建查询车次的提示词
+                prompt = SEARCH_TRAINS.render(
+                    self.prompt_instructions,
+                    departure_date=departure_date,
+                    origin=origin,
+                    destination=destination
+                )
 
-            # 调用阿里百炼API
-            response_text = await self._call_api(prompt)
-            
-            # 解析响应
-            trains_data = self._extract_json_from_response(response_text)
-            return trains_data if trains_data and isinstance(trains_data, list) else self._get_mock_trains()
-            
+                # 调用阿里百炼API
+                response_text = await self._call_api(prompt)
+
+                # 解析响应
+                trains_data, complete = self._extract_json_from_response(response_text)
+                if isinstance(trains_data, dict):
+                    trains_data = trains_data.get('trains')
+                if trains_data and isinstance(trains_data, list):
+                    return trains_data, True if complete else "truncated"
+                return self._get_mock_trains(), False
+
+            return await self._cached_call(
+                make_cache_key(
+                    "search_trains",
+                    from_station=self._place_name(origin),
+                    to_station=self._place_name(destination),
+                    departure_date=departure_date
+                ),
+                fetch, self._get_mock_trains
+            )
+
+        except AdmissionRejectedError:
+            raise
         except Exception as e:
             print(f"搜索车次时出错: {e}")
+            self._mark_degraded("error")
             return self._get_mock_trains()
     
-    def _extract_json_from_response(self, response: str) -> Any:
-        """从AI响应中提取JSON数据"""
-        try:
-            # 尝试直接解析
-            if response.strip().startswith('[') or response.strip().startswith('{'):
-                return json.loads(response)
-        except json.JSONDecodeError:
-            pass
-            
-        # 如果直接解析失败，尝试提取JSON块
-        import re
-        
-        # 尝试提取 ```json...``` 块
-        json_pattern = r'```json\s*(.*?)\s*```'
-        match = re.search(json_pattern, response, re.DOTALL)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # 尝试查找数组或对象
-        for pattern in [r'\[.*\]', r'\{.*\}']:
-            match = re.search(pattern, response, re.DOTALL)
-            if match:
-                try:
-                    return json.loads(match.group(0))
-                except json.JSONDecodeError:
-                    pass
-        
-        return None
+    def _extract_json_from_response(self, response: str) -> Tuple[Any, bool]:
+        """从AI响应中提取JSON数据（单次扫描，跳过说明文字和代码块标记，截断时尝试修复）
+
+        返回(数据, 是否完整)；截断修复得到的数据可能缺少末尾的元素，不应按完整结果缓存。
+        """
+        return extract_json_checked(response)
     
     def _get_mock_trains(self) -> List[Dict]:
         """模拟车次数据"""
@@ -487,66 +1196,176 @@ class AlibabaAIClient:
             if not self.api_key or not self.app_id:
                 return self._get_mock_stations_data(train_info)
             
+            # 时刻表切片和回退的查询共用本方法的时间预算
+            with self._deadline("get_route_stations"):
+                return self._with_request_names(await self._get_route_stations(train_info), train_info)
+
+        except AdmissionRejectedError:
+            raise
+        except Exception as e:
+            print(f"获取站点信息时出错: {e}")
+            self._mark_degraded("error")
+            return self._get_mock_stations_data(train_info)
+
+    async def _get_route_stations(self, train_info: Dict[str, Any]) -> Dict[str, Any]:
+        """依次尝试时刻表切片、路线综合数据投影和单独查询"""
+        # 由全程时刻表切片得到，车次的全程时刻表只需生成一次
+        if self.timetable_slicing:
+            sliced = await self._slice_train_timetable(train_info)
+            if sliced is not None:
+                if self.city_fragments:
+                    await self._attach_city_content(sliced['stations'])
+                return {
+                    "train_info": {
+                        "train_no": train_info.get('train_no', sliced['train_no']),
+                        "from_station": train_info.get('from_station', ''),
+                        "to_station": train_info.get('to_station', ''),
+                        "total_distance": sliced['total_distance'],
+                        "total_time": sliced['total_time']
+                    },
+                    "stations": sliced['stations']
+                }
+        
+        # 由路线综合数据投影得到，与路线推荐共用一次LLM调用
+        if self.route_bundle_projection:
+            return self._project_route_stations(await self.get_route_bundle(train_info))
+        
+        async def fetch():
             # 构建查询站点的提示词
-            prompt = f"""请帮我查询{train_info.get('train_no', 'G1')}次列车从{train_info.get('from_station', '北京')}到{train_info.get('to_station', '上海')}的详细途径站点信息。
-
-要求：
-1. 列出所有途径站点的详细信息
-2. 包含每个站点的经纬度坐标（用于地图标注）
-3. 包含到达时间、发车时间、停车时长、站序等信息
-4. 返回JSON格式，包含以下字段：
-
-返回格式：
-{{
-  "train_info": {{
-    "train_no": "{train_info.get('train_no', 'G1')}",
-    "from_station": "{train_info.get('from_station', '北京')}",
-    "to_station": "{train_info.get('to_station', '上海')}",
-    "total_distance": "1318公里",
-    "total_time": "5小时55分"
-  }},
-  "stations": [
-    {{
-      "sequence": 1,
-      "name": "北京南站",
-      "arrival_time": "始发站",
-      "departure_time": "08:30",
-      "stop_duration": "0分钟",
-      "longitude": 116.378631,
-      "latitude": 39.865689,
-      "city": "北京",
-      "is_major": true,
-      "attractions": ["天安门广场", "故宫", "颐和园"],
-      "local_food": ["北京烤鸭", "炸酱面", "豆汁"]
-    }},
-    {{
-      "sequence": 2,
-      "name": "济南西站",
-      "arrival_time": "10:25",
-      "departure_time": "10:27",
-      "stop_duration": "2分钟",
-      "longitude": 116.823834,
-      "latitude": 36.671162,
-      "city": "济南",
-      "is_major": true,
-      "attractions": ["趵突泉", "大明湖", "千佛山"],
-      "local_food": ["把子肉", "甜沫", "油旋"]
-    }}
-  ]
-}}
-
-请确保返回有效的JSON格式，经纬度坐标要准确。"""
+            template = ROUTE_STATIONS_COMPACT if self.compact_stations else ROUTE_STATIONS
+            prompt = template.render(
+                self.prompt_instructions,
+                train_no=train_info.get('train_no', 'G1'),
+                from_station=train_info.get('from_station', '北京'),
+                to_station=train_info.get('to_station', '上海')
+            )
 
             # 调用阿里百炼API
             response_text = await self._call_api(prompt)
-            
+
             # 解析响应
-            stations_data = self._extract_json_from_response(response_text)
-            return stations_data if stations_data and isinstance(stations_data, dict) else self._get_mock_stations_data(train_info)
+            stations_data, complete = self._extract_json_from_response(response_text)
+            if stations_data and isinstance(stations_data, dict):
+                stations_data['stations'] = expand_stations(stations_data.get('stations', []))
+                return stations_data, True if complete else "truncated"
+            return self._get_mock_stations_data(train_info), False
+
+        return await self._cached_call(
+            self._route_cache_key("get_route_stations", train_info), fetch,
+            lambda: self._get_mock_stations_data(train_info)
+        )
+
+    async def _slice_train_timetable(self, train_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """从车次的全程时刻表中切出本次区间，无法获取或找不到区间时返回None
+
+        失败时撤销时刻表查询设置的降级标记，由调用方的回退查询决定本次结果是否降级。
+        """
+        token = _degraded_reason.set(_degraded_reason.get())
+        timetable = await self.get_train_timetable(train_info)
+        sliced = None
+        if timetable is not None:
+            sliced = slice_timetable(
+                timetable['stations'],
+                self._place_name(train_info.get('from_station')),
+                self._place_name(train_info.get('to_station'))
+            )
+        if sliced is None:
+            _degraded_reason.reset(token)
+            return None
+        sliced['train_no'] = timetable['train_no']
+        return sliced
+
+    async def get_train_timetable(self, train_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """获取车次的全程时刻表 {"train_no", "stations"}，按车次缓存，无法获取时返回None"""
+        if not self.api_key or not self.app_id or not train_info.get('train_no'):
+            return None
+        
+        async def fetch():
+            if self.timetable_segments:
+                stations = await self._fetch_timetable_segments(train_info)
+                if stations is not None:
+                    return {"train_no": str(train_info['train_no']).strip().upper(), "stations": stations}, True
             
+            # 启用城市内容片段时景点美食由片段提供，时刻表只需要站点骨架
+            template = TRAIN_TIMETABLE_SKELETON if self.city_fragments else TRAIN_TIMETABLE
+            prompt = template.render(
+                self.prompt_instructions,
+                train_no=train_info.get('train_no', ''),
+                from_station=train_info.get('from_station', ''),
+                to_station=train_info.get('to_station', '')
+            )
+            response_text = await self._call_api(prompt)
+            
+            data, complete = self._extract_json_from_response(response_text)
+            stations = expand_stations(data.get('stations')) if isinstance(data, dict) else None
+            if isinstance(stations, list):
+                stations = [station for station in stations if isinstance(station, dict) and station.get('name')]
+                if len(stations) >= 2:
+                    timetable = {"train_no": str(train_info['train_no']).strip().upper(), "stations": stations}
+                    # 截断的时刻表缺少后面的站点，只用于本次请求
+                    return timetable, True if complete else "truncated"
+            return None, False
+        
+        return await self._cached_call(
+            make_cache_key("get_train_timetable", train_no=train_info.get('train_no')), fetch, lambda: None
+        )
+
+    async def _fetch_timetable_segments(self, train_info: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """按枢纽站把长途车次的全程时刻表分成相互重叠的区段并发生成，再拼接成全程
+
+        停靠站数低于阈值、枢纽站不足或任一区段失败时返回None，由调用方改用单次生成。
+        """
+        train_no = train_info.get('train_no', '')
+        try:
+            response_text = await self._call_api(TIMETABLE_HUBS.render(self.prompt_instructions, train_no=train_no))
+        except (AdmissionRejectedError, CircuitOpenError, PoolSaturatedError):
+            raise
         except Exception as e:
-            print(f"获取站点信息时出错: {e}")
-            return self._get_mock_stations_data(train_info)
+            print(f"⚠️  {train_no}次枢纽站查询失败，改为整段生成: {e}")
+            return None
+        data, complete = self._extract_json_from_response(response_text)
+        if not isinstance(data, dict) or not complete:
+            return None
+        hubs = [str(hub).strip() for hub in data.get('hubs') or [] if str(hub).strip()]
+        try:
+            total_stops = int(data.get('total_stops') or 0)
+        except (TypeError, ValueError):
+            total_stops = 0
+        if total_stops < self.timetable_segment_min_stops or len(hubs) < 3:
+            return None
+        
+        # 在枢纽站中均匀选出分段点，相邻区段共用分界站
+        count = min(self.timetable_segment_max, len(hubs) - 1)
+        if count < 2:
+            return None
+        bounds = [hubs[round(i * (len(hubs) - 1) / count)] for i in range(count + 1)]
+        
+        async def segment(from_station: str, to_station: str) -> Optional[List[Dict[str, Any]]]:
+            template = TIMETABLE_SEGMENT_SKELETON if self.city_fragments else TIMETABLE_SEGMENT
+            prompt = template.render(
+                self.prompt_instructions, train_no=train_no, from_station=from_station, to_station=to_station
+            )
+            data, complete = self._extract_json_from_response(await self._call_api(prompt))
+            stations = expand_stations(data.get('stations')) if isinstance(data, dict) else None
+            if not isinstance(stations, list) or not complete:
+                return None
+            stations = [station for station in stations if isinstance(station, dict) and station.get('name')]
+            return stations if len(stations) >= 2 else None
+        
+        segments = await asyncio.gather(
+            *(segment(bounds[i], bounds[i + 1]) for i in range(count)), return_exceptions=True
+        )
+        for result in segments:
+            if isinstance(result, AdmissionRejectedError):
+                raise result
+        if any(not isinstance(result, list) for result in segments):
+            print(f"⚠️  {train_no}次分段时刻表生成不完整，改为整段生成")
+            return None
+        
+        stations = stitch_segments(segments)
+        if stations is None:
+            print(f"⚠️  {train_no}次分段时刻表的分界站对不上，改为整段生成")
+        return stations
 
     def _get_mock_stations_data(self, train_info: Dict[str, Any]) -> Dict[str, Any]:
         """模拟站点数据（当API不可用时使用）"""
@@ -647,6 +1466,488 @@ class AlibabaAIClient:
         
         return stations_data
 
+    async def get_route_bundle(self, train_info: Dict[str, Any]) -> Dict[str, Any]:
+        """一次LLM调用同时获取路线推荐、旅行贴士和途径站点"""
+        try:
+            # 如果没有配置API密钥或应用ID，使用模拟数据
+            if not self.api_key or not self.app_id:
+                return self._get_mock_bundle(train_info)
+            
+            async def fetch():
+                # 反方向或同区间其他车次已生成过沿途内容时，只需获取本车次的时刻表
+                assembled = await self._assemble_bundle_from_content(train_info)
+                if assembled is not None:
+                    return assembled, True
+                
+                # 时刻表切片加上城市内容片段，只有缓存中没有的城市需要调用LLM
+                if self.city_fragments:
+                    assembled = await self._assemble_bundle_from_fragments(train_info)
+                    if assembled is not None:
+                        return assembled
+                
+                prompt = self._build_bundle_prompt(train_info)
+                
+                # 调用阿里百炼API
+                response_text = await self._call_api(prompt)
+                
+                # 解析响应
+                bundle, complete = self._extract_json_from_response(response_text)
+                if isinstance(bundle, dict) and isinstance(bundle.get('stations'), list) and bundle['stations']:
+                    bundle = self._normalize_bundle(bundle, train_info)
+                    if not complete:
+                        return bundle, "truncated"
+                    await self._store_route_content(train_info, bundle)
+                    return bundle, True
+                return self._get_mock_bundle(train_info), False
+            
+            bundle = await self._cached_call(
+                self._route_cache_key("get_route_bundle", train_info), fetch,
+                lambda: self._get_mock_bundle(train_info)
+            )
+            return self._with_request_names(bundle, train_info)
+            
+        except AdmissionRejectedError:
+            raise
+        except Exception as e:
+            print(f"获取路线综合信息时出错: {e}")
+            self._mark_degraded("error")
+            return self._get_mock_bundle(train_info)
+
+    async def stream_route_bundle(self, train_info: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+        """流式获取路线综合数据，每个站点/城市/贴士生成完毕立即产出
+
+        产出 (事件, 数据)：route_info、station、city、tip，最后是包含完整数据的 done，
+        生成中途失败时以 error 结束。
+        命中缓存或无法调用API时，按相同的事件顺序回放已有数据。
+        """
+        key = self._route_cache_key("get_route_bundle", train_info)
+        bundle = None
+        if self.api_key and self.app_id:
+            bundle = self._with_request_names(await self._cache_lookup(key), train_info)
+        else:
+            bundle = self._get_mock_bundle(train_info)
+        
+        if bundle is None and self.api_key and self.app_id:
+            # 能从时刻表切出本区间且已有沿途内容或启用城市片段时，路线综合数据不需要整段生成，
+            # 交给 get_route_bundle 拼装，与非流式接口共用缓存、请求合并和时间预算
+            content_cached = await self._cache_lookup(self._content_cache_key(train_info)) is not None
+            sliced = None
+            if self.city_fragments or content_cached:
+                with self._deadline("get_route_bundle"):
+                    sliced = await self._slice_train_timetable(train_info)
+                    if sliced is not None:
+                        parts = {} if content_cached else self._bundle_part_tasks(train_info, sliced)
+                        assembly = asyncio.ensure_future(self.get_route_bundle(train_info))
+            if sliced is not None:
+                async for event in self._stream_assembly(train_info, sliced, assembly, parts, early=not content_cached):
+                    yield event
+                return
+        
+        if bundle is not None:
+            for event in self._bundle_events(bundle):
+                yield event
+            return
+        
+        item_events = {"stations": "station", "attractions": "city", "travel_tips": "tip"}
+        scanner = JSONStreamScanner()
+        streamed = False
+        _call_label.set("stream_route_bundle")
+        try:
+            prompt = self._build_bundle_prompt(train_info)
+            async for chunk in self._stream_api(prompt):
+                for kind, field, value in scanner.feed(chunk):
+                    if kind == "field" and field == "route_info":
+                        streamed = True
+                        yield "route_info", value
+                    elif kind == "item" and field in item_events:
+                        if field == "stations":
+                            value = expand_station(value)
+                            if value is None:
+                                continue
+                        streamed = True
+                        yield item_events[field], value
+            
+            parsed = scanner.result()
+            if isinstance(parsed, dict) and isinstance(parsed.get('stations'), list) and parsed['stations']:
+                bundle = self._normalize_bundle(parsed, train_info)
+                # 输出被截断时只返回给本次请求，不写入缓存
+                if not scanner.repaired:
+                    self._cache_store(key, bundle)
+                    await self._store_route_content(train_info, bundle)
+            
+        except AdmissionRejectedError:
+            raise
+        except Exception as e:
+            print(f"流式获取路线综合信息时出错: {e}")
+        
+        if bundle is None:
+            if streamed:
+                # 已经发出部分内容，不再混入模拟数据
+                yield "error", "路线数据生成中断"
+                return
+            for event in self._bundle_events(self._get_mock_bundle(train_info)):
+                yield event
+            return
+        
+        yield "done", bundle
+
+    def _bundle_part_tasks(self, train_info: Dict[str, Any], sliced: Dict[str, Any]) -> Dict[asyncio.Task, Optional[str]]:
+        """与拼装任务同时发起的旅行贴士和各城市片段查询，值为城市名(贴士为None)
+
+        相同的查询由请求合并与拼装任务共享同一次LLM调用；未启用请求合并时不单独发起，避免重复调用。
+        """
+        if not self.singleflight:
+            return {}
+        slots = self._city_fragment_slots()
+        parts = {asyncio.ensure_future(self.get_travel_tips(train_info)): None}
+        for city in self._fragment_cities(sliced['stations']):
+            parts[asyncio.ensure_future(self.get_city_content(city, slots))] = city
+        return parts
+
+    async def _stream_assembly(
+        self,
+        train_info: Dict[str, Any],
+        sliced: Dict[str, Any],
+        assembly: asyncio.Future,
+        parts: Dict[asyncio.Task, Optional[str]],
+        early: bool
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """产出拼装中的路线综合数据
+
+        early 时切片一到就发出路线概要和站点，城市内容和贴士在各自的查询完成时发出，最后以拼装结果结束；
+        否则(沿途内容已缓存，拼装很快)等拼装完成后按顺序回放。
+        """
+        pending = set(parts)
+        try:
+            if early:
+                yield "route_info", self._sliced_route_info(train_info, sliced)
+                for station in sliced['stations']:
+                    yield "station", station
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # 查询失败时城市由拼装结果中的本地数据顶替，错误由拼装任务处理
+                    result = task.result() if task.exception() is None else None
+                    if result is None:
+                        continue
+                    if parts[task] is None:
+                        for tip in result:
+                            yield "tip", tip
+                    else:
+                        yield "city", dict(result, city=parts[task])
+            bundle = await assembly
+        finally:
+            # 客户端断开时不再等待；共享的LLM调用在请求合并中继续完成并写入缓存
+            for task in (*pending, assembly):
+                if not task.done():
+                    task.cancel()
+        
+        if not early:
+            for event in self._bundle_events(bundle):
+                yield event
+            return
+        if not parts:
+            for attraction in bundle['attractions']:
+                yield "city", attraction
+            for tip in bundle['travel_tips']:
+                yield "tip", tip
+        yield "done", bundle
+
+    def _content_cache_key(self, train_info: Dict[str, Any], method: str = "route_content") -> CacheKey:
+        """沿途内容与方向无关，A→B 和 B→A 共用同一个键"""
+        endpoints = sorted([self._place_name(train_info.get('from_station')), self._place_name(train_info.get('to_station'))])
+        return make_cache_key(method, from_station=endpoints[0], to_station=endpoints[1])
+
+    async def _store_route_content(self, train_info: Dict[str, Any], bundle: Dict[str, Any]) -> None:
+        """从路线综合数据中拆出与方向无关的部分：城市景点美食、旅行贴士和站点坐标"""
+        geography = {
+            station['name']: [station.get('longitude'), station.get('latitude'), station.get('city', '')]
+            for station in bundle['stations']
+            if station.get('name') and station.get('longitude') is not None and station.get('latitude') is not None
+        }
+        self._cache_store(self._content_cache_key(train_info), {
+            "attractions": bundle['attractions'],
+            "travel_tips": bundle['travel_tips'],
+            "geography": geography
+        })
+        
+        # 整条路线生成的城市内容同时作为城市片段，供经过这些城市的其他路线使用
+        if self.city_fragments:
+            for attraction in bundle['attractions']:
+                key = self._city_cache_key(attraction['city'])
+                if await self._cache_lookup(key) is None:
+                    self._cache_store(key, attraction)
+
+    async def _assemble_bundle_from_content(self, train_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """用已缓存的沿途内容加上本车次时刻表的切片拼出路线综合数据，缺少任一部分时返回None"""
+        content = await self._cache_lookup(self._content_cache_key(train_info))
+        if content is None:
+            return None
+        
+        sliced = await self._slice_train_timetable(train_info)
+        if sliced is None:
+            return None
+        
+        # 站点坐标以已有的地理数据为准，保证两个方向在地图上完全一致
+        geography = content.get('geography') or {}
+        for station in sliced['stations']:
+            known = geography.get(station.get('name'))
+            if known:
+                station['longitude'], station['latitude'] = known[0], known[1]
+                station.setdefault('city', known[2])
+        
+        # 缓存的内容覆盖整条线路，只保留本区间经过的城市，并按本方向的途经顺序排列
+        order = {}
+        for index, station in enumerate(sliced['stations']):
+            order.setdefault(self._place_name(station.get('city')), index)
+        attractions = sorted(
+            (attraction for attraction in content.get('attractions') or []
+             if self._place_name(attraction.get('city')) in order),
+            key=lambda attraction: order[self._place_name(attraction.get('city'))]
+        )
+        
+        return self._normalize_bundle({
+            "route_info": self._sliced_route_info(train_info, sliced),
+            "stations": sliced['stations'],
+            "attractions": attractions,
+            "travel_tips": content.get('travel_tips') or []
+        }, train_info)
+
+    def _sliced_route_info(self, train_info: Dict[str, Any], sliced: Dict[str, Any]) -> Dict[str, Any]:
+        """由时刻表切片得到的路线概要"""
+        return {
+            "train_no": train_info.get('train_no', '未知'),
+            "from_station": train_info.get('from_station', '未知'),
+            "to_station": train_info.get('to_station', '未知'),
+            "travel_time": sliced['total_time'],
+            "total_distance": sliced['total_distance']
+        }
+
+    def _city_cache_key(self, city: str) -> CacheKey:
+        return make_cache_key("get_city_content", from_station=self._place_name(city))
+
+    async def get_city_content(self, city: str, slots: Optional[asyncio.Semaphore] = None) -> Optional[Dict[str, Any]]:
+        """获取城市的景点、美食和简介，按城市缓存，与经过的车次和区间无关；无法获取时返回None
+
+        slots 限制同一批城市中同时调用LLM的数量，命中缓存时不占用。
+        """
+        if not self.api_key or not self.app_id or not city:
+            return None
+        
+        async def fetch():
+            if slots is None:
+                return await generate()
+            async with slots:
+                return await generate()
+        
+        async def generate():
+            response_text = await self._call_api(CITY_CONTENT.render(self.prompt_instructions, city=city))
+            data, complete = self._extract_json_from_response(response_text)
+            if isinstance(data, dict) and (data.get('scenic_spots') or data.get('local_food')):
+                return {
+                    "city": city,
+                    "scenic_spots": list(data.get('scenic_spots') or []),
+                    "local_food": list(data.get('local_food') or []),
+                    "description": str(data.get('description') or '')
+                }, True if complete else "truncated"
+            return None, False
+        
+        try:
+            return await self._cached_call(self._city_cache_key(city), fetch, lambda: None)
+        except AdmissionRejectedError:
+            raise
+        except Exception as e:
+            print(f"获取城市内容时出错({city}): {e}")
+            return None
+
+    async def get_travel_tips(self, train_info: Dict[str, Any]) -> Optional[List[str]]:
+        """获取区间的旅行贴士，与方向无关，无法获取时返回None"""
+        if not self.api_key or not self.app_id:
+            return None
+        
+        async def fetch():
+            prompt = TRAVEL_TIPS.render(
+                self.prompt_instructions,
+                train_no=train_info.get('train_no', '未知'),
+                from_station=train_info.get('from_station', '未知'),
+                to_station=train_info.get('to_station', '未知')
+            )
+            data, complete = self._extract_json_from_response(await self._call_api(prompt))
+            tips = data.get('travel_tips') if isinstance(data, dict) else data
+            if isinstance(tips, list) and tips:
+                return [str(tip) for tip in tips], True if complete else "truncated"
+            return None, False
+        
+        try:
+            return await self._cached_call(self._content_cache_key(train_info, "get_travel_tips"), fetch, lambda: None)
+        except AdmissionRejectedError:
+            raise
+        except Exception as e:
+            print(f"获取旅行贴士时出错: {e}")
+            return None
+
+    def _fragment_cities(self, stations: List[Dict[str, Any]]) -> List[str]:
+        """按途经顺序取各站所在的城市，同一城市只取一次"""
+        cities: List[str] = []
+        seen = set()
+        for station in stations:
+            city = station.get('city')
+            if not city:
+                continue
+            name = self._place_name(city)
+            if name not in seen:
+                seen.add(name)
+                cities.append(city)
+        return cities
+
+    def _city_fragment_slots(self) -> asyncio.Semaphore:
+        """一条路线中同时生成城市片段的名额，未命中缓存的城市超过名额时排队"""
+        return asyncio.Semaphore(max(1, self.city_fragments_concurrency))
+
+    async def _attach_city_content(self, stations: List[Dict[str, Any]]) -> None:
+        """为只有骨架字段的站点补上所在城市的景点和美食
+
+        每个城市的片段优先取缓存，缺少的并发生成；生成失败的城市使用本地数据，本次结果标记为 partial。
+        """
+        if all('attractions' in station for station in stations):
+            return
+        cities = self._fragment_cities(stations)
+        slots = self._city_fragment_slots()
+        fragments = await asyncio.gather(*(self.get_city_content(city, slots) for city in cities))
+        content = {self._place_name(city): fragment for city, fragment in zip(cities, fragments) if fragment}
+        for station in stations:
+            if 'attractions' in station:
+                continue
+            city = station.get('city', '')
+            fragment = content.get(self._place_name(city))
+            station['attractions'] = fragment['scenic_spots'] if fragment else self._get_city_attractions(city)
+            station['local_food'] = fragment['local_food'] if fragment else self._get_city_food(city)
+        if len(content) < len(cities):
+            self._mark_degraded("partial")
+
+    async def _assemble_bundle_from_fragments(self, train_info: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Any]]:
+        """用本车次时刻表的切片和各城市的内容片段拼出路线综合数据
+
+        每个途经城市的片段优先取缓存，缺少的片段和旅行贴士并发生成；生成失败的城市由本地数据顶替。
+        返回 (数据, 是否可缓存)，部分片段获取失败时第二项为 "partial"，不进入缓存；
+        时刻表中找不到该区间时返回None。
+        """
+        sliced = await self._slice_train_timetable(train_info)
+        if sliced is None:
+            return None
+        
+        cities = self._fragment_cities(sliced['stations'])
+        slots = self._city_fragment_slots()
+        tips, *fragments = await asyncio.gather(
+            self.get_travel_tips(train_info),
+            *(self.get_city_content(city, slots) for city in cities)
+        )
+        attractions = [dict(fragment, city=city) for city, fragment in zip(cities, fragments) if fragment is not None]
+        complete = tips is not None and len(attractions) == len(cities)
+        
+        bundle = self._normalize_bundle({
+            "route_info": self._sliced_route_info(train_info, sliced),
+            "stations": sliced['stations'],
+            "attractions": attractions,
+            "travel_tips": tips or []
+        }, train_info)
+        if not complete:
+            return bundle, "partial"
+        await self._store_route_content(train_info, bundle)
+        return bundle, True
+
+    def _bundle_events(self, bundle: Dict[str, Any]):
+        """把完整的路线综合数据拆成与流式输出相同的事件序列"""
+        yield "route_info", bundle['route_info']
+        for station in bundle['stations']:
+            yield "station", station
+        for attraction in bundle['attractions']:
+            yield "city", attraction
+        for tip in bundle['travel_tips']:
+            yield "tip", tip
+        yield "done", bundle
+
+    def _build_bundle_prompt(self, train_info: Dict[str, Any]) -> str:
+        """构建路线综合数据的提示词"""
+        template = ROUTE_BUNDLE_COMPACT if self.compact_stations else ROUTE_BUNDLE
+        return template.render(
+            self.prompt_instructions,
+            train_no=train_info.get('train_no', '未知'),
+            from_station=train_info.get('from_station', '未知'),
+            to_station=train_info.get('to_station', '未知')
+        )
+
+    def _normalize_bundle(self, bundle: Dict[str, Any], train_info: Dict[str, Any]) -> Dict[str, Any]:
+        """补全路线综合数据的字段，并把城市景点美食挂到对应站点上"""
+        route_info = bundle.get('route_info') if isinstance(bundle.get('route_info'), dict) else {}
+        route_info.setdefault('train_no', train_info.get('train_no', '未知'))
+        route_info.setdefault('from_station', train_info.get('from_station', '未知'))
+        route_info.setdefault('to_station', train_info.get('to_station', '未知'))
+        route_info.setdefault('travel_time', '')
+        
+        attractions = []
+        for attraction in bundle.get('attractions') or []:
+            if not isinstance(attraction, dict) or not attraction.get('city'):
+                continue
+            # 模型可能把字段写成null，setdefault不会替换
+            attraction['scenic_spots'] = attraction.get('scenic_spots') or []
+            attraction['local_food'] = attraction.get('local_food') or []
+            attraction['description'] = attraction.get('description') or ''
+            attractions.append(attraction)
+        city_content = {self._place_name(attraction['city']): attraction for attraction in attractions}
+        
+        stations = []
+        for station in expand_stations(bundle['stations']):
+            if not isinstance(station, dict):
+                continue
+            content = city_content.get(self._place_name(station.get('city')))
+            if station.get('attractions') is None:
+                station['attractions'] = content['scenic_spots'] if content else self._get_city_attractions(station.get('city', ''))
+            if station.get('local_food') is None:
+                station['local_food'] = content['local_food'] if content else self._get_city_food(station.get('city', ''))
+            stations.append(station)
+        
+        return {
+            "route_info": route_info,
+            "attractions": attractions,
+            "travel_tips": bundle.get('travel_tips') or [],
+            "train_info": {
+                "train_no": route_info['train_no'],
+                "from_station": route_info['from_station'],
+                "to_station": route_info['to_station'],
+                "total_distance": route_info.get('total_distance', ''),
+                "total_time": route_info['travel_time']
+            },
+            "stations": stations
+        }
+
+    def _project_route_recommendations(self, bundle: Dict[str, Any]) -> Dict[str, Any]:
+        """从路线综合数据中取出路线推荐部分"""
+        return {
+            "route_info": bundle['route_info'],
+            "attractions": bundle['attractions'],
+            "travel_tips": bundle['travel_tips']
+        }
+
+    def _project_route_stations(self, bundle: Dict[str, Any]) -> Dict[str, Any]:
+        """从路线综合数据中取出站点信息部分"""
+        return {
+            "train_info": bundle['train_info'],
+            "stations": bundle['stations']
+        }
+
+    def _get_mock_bundle(self, train_info: Dict[str, Any]) -> Dict[str, Any]:
+        """模拟路线综合数据（当API不可用时使用）"""
+        route_data = self._get_mock_route_data(train_info)
+        stations_data = self._get_mock_stations_data(train_info)
+        return {
+            "route_info": route_data['route_info'],
+            "attractions": route_data['attractions'],
+            "travel_tips": route_data['travel_tips'],
+            "train_info": stations_data['train_info'],
+            "stations": stations_data['stations']
+        }
+
     def _get_city_attractions(self, city: str) -> List[str]:
         """根据城市返回主要景点"""
         attractions_map = {
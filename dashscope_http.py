@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+百炼应用HTTP传输模块 - 通过共享的httpx.AsyncClient直接调用DashScope应用接口
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/api/v1"
+
+
+class DashScopeAPIError(Exception):
+    """百炼接口返回非200状态"""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"API调用失败: {status_code} {message}".strip())
+        self.status_code = status_code
+        self.message = message
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要安装 h2 (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class DashScopeHTTPTransport:
+    """基于长连接池的百炼应用调用，所有请求共享一个AsyncClient"""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        http2: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            print("⚠️  未安装h2，百炼HTTP传输将使用HTTP/1.1")
+
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 运行状态统计
+        self.warmed = False
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.http_versions: Dict[str, int] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """懒加载共享客户端"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+        return self._client
+
+    async def start(self) -> None:
+        """预热连接：提前完成DNS解析和TLS握手，让连接进入keep-alive池"""
+        client = self._get_client()
+        try:
+            await client.head("/")
+            self.warmed = True
+        except httpx.HTTPError as e:
+            print(f"⚠️  百炼连接预热失败: {e}")
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def complete(
+        self,
+        api_key: str,
+        app_id: str,
+        prompt: str,
+        timeout: Optional[float] = None,
+        **parameters: Any
+    ) -> Dict[str, Any]:
+        """调用应用completion接口，返回完整响应（output为生成结果，usage为token用量）"""
+        client = self._get_client()
+        payload = {
+            "input": {"prompt": prompt},
+            "parameters": parameters,
+            "debug": {}
+        }
+        headers = {"Authorization": f"Bearer {api_key}"}
+
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await client.post(
+                f"/apps/{app_id}/completion",
+                json=payload,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+            )
+            self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+
+            if response.status_code != 200:
+                try:
+                    message = response.json().get("message", "")
+                except ValueError:
+                    message = response.text[:200]
+                raise DashScopeAPIError(response.status_code, message)
+
+            return response.json()
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def stream(
+        self,
+        api_key: str,
+        app_id: str,
+        prompt: str,
+        **parameters: Any
+    ) -> AsyncIterator[str]:
+        """以SSE方式调用应用接口，逐段产出增量文本"""
+        client = self._get_client()
+        payload = {
+            "input": {"prompt": prompt},
+            "parameters": {**parameters, "incremental_output": True},
+            "debug": {}
+        }
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "X-DashScope-SSE": "enable"
+        }
+
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            async with client.stream("POST", f"/apps/{app_id}/completion", json=payload, headers=headers) as response:
+                self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    raise DashScopeAPIError(response.status_code, body[:200])
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[5:])
+                    if "code" in event and "output" not in event:
+                        raise DashScopeAPIError(response.status_code, event.get("message", ""))
+                    text = (event.get("output") or {}).get("text") or ""
+                    if text:
+                        yield text
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回连接池配置和调用统计"""
+        return {
+            "base_url": self.base_url,
+            "http2": self.http2,
+            "warmed": self.warmed,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "http_versions": dict(self.http_versions)
+        }
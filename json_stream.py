@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+流式JSON扫描模块 - 单次线性扫描从大模型回复中提取JSON，支持逐段输入和截断修复
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+# (事件类型, 顶层字段名, 值)
+# item: 顶层数组中的一个元素已完整，如 stations 中的一个站点；根本身是数组时字段名为空串
+# field: 根对象的非数组字段已完整，如 route_info
+StreamEvent = Tuple[str, str, Any]
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_END = ",}]" + _WHITESPACE
+
+
+class _Frame:
+    """扫描栈中的一层容器"""
+
+    __slots__ = ("kind", "start", "parent_key", "key", "expect_key", "safe_end")
+
+    def __init__(self, kind: str, start: int, parent_key: Optional[str]):
+        self.kind = kind
+        self.start = start
+        self.parent_key = parent_key
+        self.key: Optional[str] = None
+        self.expect_key = kind == "{"
+        # 本层最后一个完整成员结束的位置，用于截断修复
+        self.safe_end = start + 1
+
+
+class JSONStreamScanner:
+    """增量扫描回复中的第一个顶层JSON值
+
+    - 跳过根值之前的任何文本（说明文字、markdown代码块标记）
+    - 每个字符只处理一次，可以随流式输出逐段 feed
+    - emit=True 时，顶层数组元素和根对象字段闭合时立即产出事件
+    - 回复被截断时，result() 丢弃未写完的元素，保留此前完整的部分并补齐括号，
+      此时 repaired 为True，结果可能缺少末尾的元素
+    """
+
+    def __init__(self, emit: bool = True):
+        self.emit = emit
+        self.text = ""
+        self.done = False
+        self.repaired = False
+        self._pos = 0
+        self._root_start = -1
+        self._value: Any = None
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._scalar_start = -1
+
+    def feed(self, chunk: str) -> List[StreamEvent]:
+        """追加一段输出，返回这段输出中新完成的片段"""
+        events: List[StreamEvent] = []
+        if self.done or not chunk:
+            return events
+        self.text += chunk
+        text = self.text
+        length = len(text)
+
+        while self._pos < length and not self.done:
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string(self._string_start, i + 1, events)
+                continue
+
+            if not self._stack:
+                # 根值之前的内容全部跳过
+                if c == "{" or c == "[":
+                    self._root_start = i
+                    self._stack.append(_Frame(c, i, None))
+                continue
+
+            if self._scalar_start >= 0 and c in _SCALAR_END:
+                self._on_value(self._scalar_start, i, False, events)
+                self._scalar_start = -1
+
+            top = self._stack[-1]
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == "{" or c == "[":
+                parent_key = top.key if top.kind == "{" else top.parent_key
+                self._stack.append(_Frame(c, i, parent_key))
+            elif c == "}" or c == "]":
+                frame = self._stack.pop()
+                if not self._stack:
+                    self._on_root(i + 1)
+                else:
+                    self._on_value(frame.start, i + 1, frame.kind == "[", events)
+            elif c == ":":
+                top.expect_key = False
+            elif c == ",":
+                if top.kind == "{":
+                    top.expect_key = True
+            elif c not in _WHITESPACE and self._scalar_start < 0:
+                self._scalar_start = i
+
+        return events
+
+    def result(self, repair: bool = True) -> Any:
+        """返回解析结果；未闭合时按需修复截断，失败返回None"""
+        if self.done:
+            return self._value
+        if not repair or self._root_start < 0 or not self._stack:
+            return None
+
+        # 只有对象字段下的数组(如 stations)可以保留已完整的元素；未闭合的对象和数组中的数组元素
+        # 本身就是写了一半的元素，从最外层的这种容器开始整体丢弃
+        keep = len(self._stack)
+        for index in range(1, len(self._stack)):
+            if self._stack[index].kind == "{" or self._stack[index - 1].kind == "[":
+                keep = index
+                break
+        frames = self._stack[:keep]
+        closers = "".join("}" if frame.kind == "{" else "]" for frame in reversed(frames))
+        try:
+            value = json.loads(self.text[self._root_start:frames[-1].safe_end] + closers)
+        except json.JSONDecodeError:
+            return None
+        self.repaired = True
+        return value
+
+    def _on_root(self, end: int) -> None:
+        """根值闭合：解析成功即结束，否则说明命中的是正文中的括号，从下一个字符重新寻找"""
+        try:
+            self._value = json.loads(self.text[self._root_start:end])
+            self.done = True
+        except json.JSONDecodeError:
+            self._pos = self._root_start + 1
+            self._root_start = -1
+            self._scalar_start = -1
+
+    def _mark_safe(self, end: int) -> None:
+        self._stack[-1].safe_end = end
+
+    def _on_string(self, start: int, end: int, events: List[StreamEvent]) -> None:
+        top = self._stack[-1]
+        if top.kind == "{" and top.expect_key:
+            top.key = self._loads(start, end)
+            return
+        self._on_value(start, end, False, events)
+
+    def _on_value(self, start: int, end: int, is_array: bool, events: List[StreamEvent]) -> None:
+        """一个值闭合：记录修复点，并为根对象字段和顶层数组元素产出事件"""
+        self._mark_safe(end)
+        if not self.emit:
+            return
+
+        depth = len(self._stack)
+        root = self._stack[0]
+        if depth == 1:
+            if root.kind == "[":
+                value = self._loads(start, end)
+                if value is not None:
+                    events.append(("item", "", value))
+            elif not is_array and root.key is not None:
+                value = self._loads(start, end)
+                if value is not None:
+                    events.append(("field", root.key, value))
+        elif depth == 2 and root.kind == "{" and self._stack[1].kind == "[":
+            value = self._loads(start, end)
+            if value is not None:
+                events.append(("item", self._stack[1].parent_key, value))
+
+    def _loads(self, start: int, end: int) -> Any:
+        try:
+            return json.loads(self.text[start:end])
+        except json.JSONDecodeError:
+            return None
+
+
+def extract_json(text: str, repair: bool = True) -> Any:
+    """从AI回复中提取第一个完整的顶层JSON值，截断时尝试修复，失败返回None"""
+    return extract_json_checked(text, repair)[0]
+
+
+def extract_json_checked(text: str, repair: bool = True) -> Tuple[Any, bool]:
+    """同 extract_json，另外返回结果是否完整（截断修复得到的结果不完整）"""
+    scanner = JSONStreamScanner(emit=False)
+    scanner.feed(text)
+    value = scanner.result(repair=repair)
+    return value, not scanner.repaired
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+LLM结果缓存模块 - 缓存大模型生成的车次、路线和站点数据
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str, str, str, str]
+
+
+def make_cache_key(
+    method: str,
+    train_no: Optional[str] = "",
+    from_station: Optional[str] = "",
+    to_station: Optional[str] = "",
+    departure_date: Optional[str] = ""
+) -> CacheKey:
+    """构建规范化的缓存键 (method, train_no, from_station, to_station, departure_date)"""
+    return (
+        method,
+        (train_no or "").strip().upper(),
+        (from_station or "").strip(),
+        (to_station or "").strip(),
+        (departure_date or "").strip()
+    )
+
+
+class _Entry:
+    """缓存条目，值以JSON文本保存，取出时重新解析，调用方修改返回值不会污染缓存"""
+
+    __slots__ = ("payload", "size", "expires_at", "refresh_at")
+
+    def __init__(self, payload: str, expires_at: float, refresh_at: Optional[float] = None):
+        self.payload = payload
+        self.size = len(payload.encode("utf-8"))
+        self.expires_at = expires_at
+        # 软过期时间: 之后仍可返回，但应在后台刷新
+        self.refresh_at = expires_at if refresh_at is None else refresh_at
+
+
+class ResultCache:
+    """进程内TTL/LRU缓存，按条目数和字节数双重限制
+
+    TTL为硬过期时间；soft_ratio小于1时，条目在 TTL×soft_ratio 之后进入软过期，
+    仍可命中但 needs_refresh 返回True。软过期时间按 refresh_jitter 比例随机提前，
+    避免同时写入的条目同时过期、同时刷新。
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        default_ttl: float = 3600,
+        max_entries: int = 2048,
+        max_bytes: int = 64 * 1024 * 1024,
+        soft_ratio: float = 1.0,
+        refresh_jitter: float = 0.1
+    ):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.soft_ratio = min(1.0, max(0.0, soft_ratio))
+        self.refresh_jitter = min(1.0, max(0.0, refresh_jitter))
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._bytes = 0
+
+        # 按方法统计命中情况
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl_for(self, method: str) -> float:
+        """获取方法对应的TTL"""
+        return self.ttls.get(method, self.default_ttl)
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回None"""
+        method = key[0]
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            # 过期条目暂不删除，在LRU淘汰之前仍可作为降级数据使用
+            self.expirations += 1
+            entry = None
+
+        if entry is None:
+            self.misses[method] = self.misses.get(method, 0) + 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits[method] = self.hits.get(method, 0) + 1
+        return json.loads(entry.payload)
+
+    def needs_refresh(self, key: CacheKey) -> bool:
+        """条目已软过期但尚未硬过期时返回True"""
+        entry = self._entries.get(key)
+        return entry is not None and entry.refresh_at <= time.time() < entry.expires_at
+
+    def get_stale(self, key: CacheKey) -> Optional[Any]:
+        """读取缓存，忽略过期时间，用于降级返回"""
+        entry = self._entries.get(key)
+        return json.loads(entry.payload) if entry is not None else None
+
+    def set(self, key: CacheKey, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        """写入缓存，超出容量时按LRU淘汰
+
+        回填持久化缓存中的条目时传入原来的过期时间，按原写入时间(过期时间减TTL)计算软过期。
+        """
+        ttl = self.ttl_for(key[0]) if ttl is None else ttl
+        now = time.time()
+        written_at = now if expires_at is None else expires_at - ttl
+        if written_at + ttl <= now:
+            return
+
+        refresh_at = None
+        if self.soft_ratio < 1.0:
+            refresh_at = written_at + ttl * self.soft_ratio * (1 - random.uniform(0, self.refresh_jitter))
+        entry = _Entry(json.dumps(value, ensure_ascii=False), written_at + ttl, refresh_at)
+        if entry.size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: CacheKey) -> None:
+        """删除指定缓存"""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存容量和命中率统计"""
+        total_hits = sum(self.hits.values())
+        total_misses = sum(self.misses.values())
+        lookups = total_hits + total_misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttls": dict(self.ttls),
+            "soft_ratio": self.soft_ratio,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": round(total_hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class DiskCache:
+    """SQLite持久化缓存层 - 重启后保留热门路线数据，同机多个worker共享读取
+
+    写入先进入内存待写队列，由后台线程批量落盘（write-behind），
+    并定期清理过期条目、在超过容量时按最早过期时间压缩。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        flush_interval: float = 2.0,
+        compact_interval: float = 300.0
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+
+        self._local = threading.local()
+        self._pending: Dict[str, Tuple[str, str, float]] = {}
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_results ("
+            " key TEXT PRIMARY KEY,"
+            " method TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_results_expires ON llm_results(expires_at)")
+        conn.commit()
+
+        # 运行状态统计
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        self.errors = 0
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="llm-disk-cache", daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程使用独立连接；WAL模式允许多进程并发读"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: CacheKey) -> str:
+        return json.dumps(list(key), ensure_ascii=False)
+
+    def get(self, key: CacheKey, allow_stale: bool = False) -> Optional[Tuple[Any, float]]:
+        """读取缓存，返回(值, 过期时间戳)，未命中返回None；allow_stale时返回尚未被压缩清理的过期条目"""
+        disk_key = self._key(key)
+        now = 0.0 if allow_stale else time.time()
+
+        with self._pending_lock:
+            pending = self._pending.get(disk_key)
+        if pending is not None and pending[2] > now:
+            self.hits += 1
+            return json.loads(pending[1]), pending[2]
+
+        try:
+            row = self._connect().execute(
+                "SELECT payload, expires_at FROM llm_results WHERE key = ? AND expires_at > ?",
+                (disk_key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️  读取持久化缓存失败: {e}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    async def get_async(self, key: CacheKey, allow_stale: bool = False) -> Optional[Tuple[Any, float]]:
+        """同 get，在线程池中执行SQLite查询，避免阻塞事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key, allow_stale)
+
+    def set(self, key: CacheKey, value: Any, ttl: float) -> None:
+        """写入待写队列，由后台线程批量落盘"""
+        if ttl <= 0:
+            return
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._pending_lock:
+            self._pending[self._key(key)] = (key[0], payload, time.time() + ttl)
+
+    def flush(self) -> None:
+        """把待写队列写入SQLite"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        now = time.time()
+        rows = [
+            (disk_key, method, payload, len(payload.encode("utf-8")), expires_at, now)
+            for disk_key, (method, payload, expires_at) in pending.items()
+        ]
+        try:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO llm_results (key, method, payload, size, expires_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            self.writes += len(rows)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️  写入持久化缓存失败，下次重试: {e}")
+            # 把这一批放回待写队列；期间同一个键有更新的写入时以新写入为准，已过期的不再重试
+            with self._pending_lock:
+                for disk_key, entry in pending.items():
+                    if entry[2] > now:
+                        self._pending.setdefault(disk_key, entry)
+
+    def compact(self) -> None:
+        """删除过期条目，超出容量时按最早过期时间淘汰"""
+        try:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_results WHERE expires_at <= ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_results").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                rows = conn.execute("SELECT key, size FROM llm_results ORDER BY expires_at").fetchall()
+                victims = []
+                for disk_key, size in rows:
+                    if excess <= 0:
+                        break
+                    victims.append((disk_key,))
+                    excess -= size
+                conn.executemany("DELETE FROM llm_results WHERE key = ?", victims)
+            conn.commit()
+            self.compactions += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️  压缩持久化缓存失败: {e}")
+
+    def _flush_loop(self) -> None:
+        """后台线程：定期落盘和压缩"""
+        last_compact = time.monotonic()
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() - last_compact >= self.compact_interval:
+                self.compact()
+                last_compact = time.monotonic()
+
+    def close(self) -> None:
+        """停止后台线程并写入剩余数据"""
+        self._stop.set()
+        self._flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回持久化缓存统计"""
+        try:
+            rows, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_results"
+            ).fetchone()
+        except sqlite3.Error:
+            rows, size = None, None
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            "path": str(self.path),
+            "rows": rows,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "pending_writes": pending,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "compactions": self.compactions,
+            "errors": self.errors
+        }
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+LLM调用控制模块 - 并发请求合并、耗时统计、对冲请求、自适应超时、熔断、准入控制等调用侧流量控制
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class SingleFlight:
+    """相同键的并发调用只执行一次，其余调用等待同一个结果
+
+    共享的工作放在独立任务中执行，发起者被取消（如客户端断开）不会影响其他等待者；
+    执行失败时异常会传递给所有等待者。共享任务的调度优先级取所有等待者中最高的一个，
+    由任务内部通过 priority(key) 读取，不沿用发起者的优先级；优先级提高时调用 on_escalate(key, priority)，
+    供调用方提升共享任务已在排队的调用。
+    """
+
+    def __init__(self, on_escalate: Optional[Callable[[Hashable, str], None]] = None):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._priorities: Dict[Hashable, str] = {}
+        self.on_escalate = on_escalate
+        self.leaders: Dict[str, int] = {}
+        self.collapsed: Dict[str, int] = {}
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+        label: str = "default",
+        priority: Optional[str] = None
+    ) -> Any:
+        """执行func，或加入相同key正在执行的调用；priority为本次调用方的调度优先级"""
+        task = self._inflight.get(key)
+        if task is None:
+            if priority is not None:
+                self._priorities[key] = priority
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.leaders[label] = self.leaders.get(label, 0) + 1
+        else:
+            current = self._priorities.get(key)
+            if priority is not None and (current is None or _priority_rank(priority) < _priority_rank(current)):
+                self._priorities[key] = priority
+                if self.on_escalate is not None:
+                    self.on_escalate(key, priority)
+            self.collapsed[label] = self.collapsed.get(label, 0) + 1
+        return await asyncio.shield(task)
+
+    def priority(self, key: Hashable) -> Optional[str]:
+        """正在执行的调用的等待者中最高的调度优先级，未记录时返回None"""
+        return self._priorities.get(key)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._priorities.pop(key, None)
+        # 所有等待者都已取消时，避免出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回合并统计"""
+        total_leaders = sum(self.leaders.values())
+        total_collapsed = sum(self.collapsed.values())
+        total = total_leaders + total_collapsed
+        return {
+            "in_flight": len(self._inflight),
+            "executed": dict(self.leaders),
+            "collapsed": dict(self.collapsed),
+            "collapse_rate": round(total_collapsed / total, 3) if total else 0.0
+        }
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    """已排序样本的p分位数（最近秩）"""
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class LatencyTracker:
+    """按标签记录最近一段时间的调用耗时，用于计算分位数"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, label: str, seconds: float) -> None:
+        """记录一次成功调用的耗时"""
+        samples = self._samples.get(label)
+        if samples is None:
+            samples = self._samples[label] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, label: str, p: float) -> Optional[float]:
+        """返回最近样本的p分位耗时，样本不足时返回None"""
+        samples = self._samples.get(label)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return _percentile(sorted(samples), p)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各标签的样本数和p50/p95/p99"""
+        result = {}
+        for label, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[label] = {
+                "samples": len(ordered),
+                "p50": round(_percentile(ordered, 50), 3),
+                "p95": round(_percentile(ordered, 95), 3),
+                "p99": round(_percentile(ordered, 99), 3)
+            }
+        return result
+
+
+class HedgedRunner:
+    """对冲请求：调用超过历史分位耗时仍未返回时再发一次，取先成功的结果并取消另一个"""
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        percentile: float = 95,
+        min_delay: float = 1.0,
+        default_delay: float = 8.0
+    ):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.hedges: Dict[str, int] = {}
+        self.hedge_wins: Dict[str, int] = {}
+
+    def delay_for(self, label: str) -> float:
+        """发出对冲请求前等待的时间"""
+        observed = self.tracker.percentile(label, self.percentile)
+        if observed is None:
+            return self.default_delay
+        return max(self.min_delay, observed)
+
+    async def run(self, label: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行func，必要时发出一次对冲请求"""
+
+        async def attempt() -> Any:
+            started = time.monotonic()
+            result = await func()
+            self.tracker.record(label, time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(attempt())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.delay_for(label))
+            if not done:
+                self.hedges[label] = self.hedges.get(label, 0) + 1
+                pending.add(asyncio.ensure_future(attempt()))
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins[label] = self.hedge_wins.get(label, 0) + 1
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回对冲次数和对冲请求胜出次数"""
+        return {
+            "percentile": self.percentile,
+            "delays": {label: round(self.delay_for(label), 3) for label in self.hedges},
+            "hedges": dict(self.hedges),
+            "hedge_wins": dict(self.hedge_wins)
+        }
+
+
+class UpstreamTimeoutError(Exception):
+    """上游调用超过自适应超时时间"""
+
+
+class AdaptiveTimeout:
+    """根据最近成功调用的耗时分位计算每次调用的超时时间
+
+    超时 = p99 × multiplier + headroom，限制在 [floor, ceiling] 之间；样本不足时使用 default。
+    只记录成功调用的耗时，故障期间卡住的调用不会拉长超时，健康但较慢的生成仍在分位范围内。
+    """
+
+    def __init__(
+        self,
+        floor: float,
+        ceiling: float,
+        default: Optional[float] = None,
+        percentile: float = 99,
+        multiplier: float = 1.5,
+        headroom: float = 1.0,
+        tracker: Optional[LatencyTracker] = None
+    ):
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.default = self.ceiling if default is None else min(self.ceiling, max(self.floor, default))
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.headroom = headroom
+        self.tracker = tracker or LatencyTracker(window=500, min_samples=20)
+        self.timeouts: Dict[str, int] = {}
+
+    def timeout_for(self, label: str) -> float:
+        """返回该标签下一次调用的超时时间(秒)"""
+        observed = self.tracker.percentile(label, self.percentile)
+        if observed is None:
+            return self.default
+        return min(self.ceiling, max(self.floor, observed * self.multiplier + self.headroom))
+
+    def record(self, label: str, seconds: float) -> None:
+        """记录一次成功调用的耗时"""
+        self.tracker.record(label, seconds)
+
+    def record_timeout(self, label: str) -> None:
+        """记录一次超时"""
+        self.timeouts[label] = self.timeouts.get(label, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各标签当前的超时时间、耗时分位和超时次数"""
+        latency = self.tracker.stats()
+        return {
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "timeouts": dict(self.timeouts),
+            "current": {label: round(self.timeout_for(label), 3) for label in latency},
+            "latency": latency
+        }
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，拒绝调用上游"""
+
+
+class CircuitBreaker:
+    """上游熔断器，按滚动窗口内的错误率和慢调用率在关闭/打开/半开之间切换
+
+    - closed: 正常放行，记录每次调用结果
+    - open: 直接拒绝，open_duration 秒后进入半开
+    - half_open: 只放行少量探测请求，全部成功则关闭，任一失败或过慢则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        slow_call_rate: float = 0.8,
+        slow_call_threshold: float = 20.0,
+        window_size: int = 20,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_probes: int = 2
+    ):
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+
+        # 窗口中的每次调用: (完成时间, 是否失败, 是否过慢)
+        self._calls: Deque[Tuple[float, bool, bool]] = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        # 运行状态统计
+        self.opens = 0
+        self.rejected = 0
+        self.last_trip_reason: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        """当前状态，打开时间到期后自动进入半开"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def allows_requests(self) -> bool:
+        """是否还能放行请求（半开时要求有空闲的探测名额）"""
+        state = self.state
+        if state == self.OPEN:
+            return False
+        if state == self.HALF_OPEN:
+            return self._probes_in_flight < self.half_open_probes
+        return True
+
+    def acquire(self) -> bool:
+        """调用上游前获取许可，返回是否为半开探测请求；不允许时抛出CircuitOpenError"""
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        raise CircuitOpenError(f"百炼熔断器{state}，暂停调用")
+
+    def record(self, probe: bool, success: bool, latency: float) -> None:
+        """记录一次调用结果"""
+        slow = latency >= self.slow_call_threshold
+        if probe:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if self._state != self.HALF_OPEN:
+                return
+            if not success or slow:
+                self._trip("探测请求失败" if not success else "探测请求过慢")
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+            return
+
+        # 熔断期间才完成的旧请求不参与统计
+        if self._state != self.CLOSED:
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, not success, slow))
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+        if len(self._calls) < self.min_calls:
+            return
+
+        total = len(self._calls)
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+        if failures / total >= self.failure_rate:
+            self._trip(f"错误率{failures}/{total}")
+        elif slow_calls / total >= self.slow_call_rate:
+            self._trip(f"慢调用率{slow_calls}/{total}")
+
+    def release(self, probe: bool) -> None:
+        """调用被取消时归还探测名额"""
+        if probe:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trip(self, reason: str) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self.opens += 1
+        self.last_trip_reason = reason
+        print(f"⚠️  百炼熔断器打开: {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        """返回熔断器状态"""
+        total = len(self._calls)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failure_rate": round(sum(1 for _, failed, _ in self._calls if failed) / total, 3) if total else 0.0,
+            "window_slow_rate": round(sum(1 for _, _, is_slow in self._calls if is_slow) / total, 3) if total else 0.0,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "last_trip_reason": self.last_trip_reason
+        }
+
+
+class AdmissionRejectedError(Exception):
+    """并发已满且等待队列已满或排队超时，应返回503"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# 调度优先级从高到低：用户请求、预取、缓存刷新
+PRIORITY_CLASSES = ("interactive", "prefetch", "refresh")
+
+
+def _priority_rank(priority: str) -> int:
+    """优先级的排序值，越小越优先；未知的优先级排在最后"""
+    return PRIORITY_CLASSES.index(priority) if priority in PRIORITY_CLASSES else len(PRIORITY_CLASSES)
+
+# 排队耗时直方图的桶上限(秒)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Waiter:
+    """排队中的一次调用"""
+
+    __slots__ = ("future", "label", "priority", "tag")
+
+    def __init__(self, future: asyncio.Future, label: str, priority: str, tag: Optional[Hashable] = None):
+        self.future = future
+        self.label = label
+        self.priority = priority
+        self.tag = tag
+
+
+class AdmissionController:
+    """准入控制与优先级调度：限制同时进行的LLM调用数，超出的请求按优先级排队
+
+    - 每个优先级有自己的并发份额，后台任务最多占用份额内的名额
+    - 名额释放时总是先交给高优先级的等待者
+    - 队列已满时，高优先级请求挤掉排在队尾的低优先级请求，否则立即拒绝
+    - 排队超过queue_timeout也拒绝，由调用方返回503和Retry-After
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 5.0,
+        retry_after: int = 2,
+        shares: Optional[Dict[str, float]] = None
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        shares = shares or {}
+        self.limits = {
+            priority: max(1, min(self.max_concurrency, int(self.max_concurrency * shares.get(priority, 1.0))))
+            for priority in PRIORITY_CLASSES
+        }
+        self._active = 0
+        self._active_by_class: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._queues: Dict[str, Deque[_Waiter]] = {priority: deque() for priority in PRIORITY_CLASSES}
+
+        # 按标签统计
+        self.admitted: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.timed_out: Dict[str, int] = {}
+        self._wait_total: Dict[str, float] = {}
+        self._wait_max: Dict[str, float] = {}
+
+        # 按优先级统计
+        self.preempted: Dict[str, int] = {priority: 0 for priority in PRIORITY_CLASSES}
+        self.wait_tracker = LatencyTracker(window=500, min_samples=1)
+        self._histograms: Dict[str, List[int]] = {
+            priority: [0] * (len(WAIT_BUCKETS) + 1) for priority in PRIORITY_CLASSES
+        }
+
+    @staticmethod
+    def _normalize(priority: str) -> str:
+        return priority if priority in PRIORITY_CLASSES else PRIORITY_CLASSES[-1]
+
+    @asynccontextmanager
+    async def slot(self, label: str = "default", priority: str = "interactive", tag: Optional[Hashable] = None):
+        """占用一个并发名额；tag用于排队期间通过 promote 提升优先级"""
+        priority = await self.acquire(label, priority, tag)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _can_start(self, priority: str) -> bool:
+        return self._active < self.max_concurrency and self._active_by_class[priority] < self.limits[priority]
+
+    def _start(self, priority: str) -> None:
+        self._active += 1
+        self._active_by_class[priority] += 1
+
+    async def acquire(self, label: str = "default", priority: str = "interactive", tag: Optional[Hashable] = None) -> str:
+        """获取并发名额，必要时按优先级排队；返回占用名额时的优先级（排队期间可能被提升），释放时使用"""
+        priority = self._normalize(priority)
+        rank = PRIORITY_CLASSES.index(priority)
+        ahead = any(self._queues[p] for p in PRIORITY_CLASSES[:rank + 1])
+        if self._can_start(priority) and not ahead:
+            self._start(priority)
+            self._record_wait(label, priority, 0.0)
+            return priority
+
+        if self._queued() >= self.max_queue and not self._preempt(rank):
+            self.rejected[label] = self.rejected.get(label, 0) + 1
+            raise AdmissionRejectedError("LLM调用繁忙，请稍后重试", self.retry_after)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), label, priority, tag)
+        self._queues[priority].append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out[label] = self.timed_out.get(label, 0) + 1
+            raise AdmissionRejectedError("LLM调用排队超时，请稍后重试", self.retry_after)
+        except asyncio.CancelledError:
+            # 名额刚好分给了已取消的等待者时，把名额还回去
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(waiter.priority)
+            raise
+        finally:
+            if waiter in self._queues[waiter.priority]:
+                self._queues[waiter.priority].remove(waiter)
+        self._record_wait(label, waiter.priority, time.monotonic() - started)
+        return waiter.priority
+
+    def promote(self, tag: Hashable, priority: str) -> None:
+        """把带有tag且优先级更低的排队调用移到priority队列，空闲名额允许时立即放行"""
+        priority = self._normalize(priority)
+        rank = PRIORITY_CLASSES.index(priority)
+        for lower in PRIORITY_CLASSES[rank + 1:]:
+            queue = self._queues[lower]
+            for waiter in [waiter for waiter in queue if waiter.tag == tag]:
+                queue.remove(waiter)
+                waiter.priority = priority
+                self._queues[priority].append(waiter)
+        self._dispatch()
+
+    def _preempt(self, rank: int) -> bool:
+        """队列已满时挤掉优先级更低的队尾等待者，为新请求腾出位置"""
+        for priority in reversed(PRIORITY_CLASSES[rank + 1:]):
+            queue = self._queues[priority]
+            while queue:
+                victim = queue.pop()
+                if victim.future.done():
+                    continue
+                victim.future.set_exception(AdmissionRejectedError("LLM调用被高优先级请求挤出队列，请稍后重试", self.retry_after))
+                self.preempted[priority] += 1
+                self.rejected[victim.label] = self.rejected.get(victim.label, 0) + 1
+                return True
+        return False
+
+    def release(self, priority: str = "interactive") -> None:
+        """归还名额，并按优先级把空出的名额分给等待者"""
+        priority = self._normalize(priority)
+        self._active -= 1
+        self._active_by_class[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """按优先级把空闲名额分给等待者"""
+        for candidate in PRIORITY_CLASSES:
+            queue = self._queues[candidate]
+            while queue and self._can_start(candidate):
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                self._start(candidate)
+                waiter.future.set_result(None)
+            if self._active >= self.max_concurrency:
+                return
+
+    def _record_wait(self, label: str, priority: str, waited: float) -> None:
+        self.admitted[label] = self.admitted.get(label, 0) + 1
+        self._wait_total[label] = self._wait_total.get(label, 0.0) + waited
+        self._wait_max[label] = max(self._wait_max.get(label, 0.0), waited)
+        self.wait_tracker.record(priority, waited)
+        histogram = self._histograms[priority]
+        for index, bound in enumerate(WAIT_BUCKETS):
+            if waited <= bound:
+                histogram[index] += 1
+                break
+        else:
+            histogram[-1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回并发占用、队列长度、按标签的排队耗时和拒绝次数，以及按优先级的排队耗时直方图"""
+        labels = set(self.admitted) | set(self.rejected) | set(self.timed_out)
+        wait_percentiles = self.wait_tracker.stats()
+        bucket_names = [f"<={int(bound * 1000)}ms" for bound in WAIT_BUCKETS] + [f">{int(WAIT_BUCKETS[-1] * 1000)}ms"]
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": self._queued(),
+            "endpoints": {
+                label: {
+                    "admitted": self.admitted.get(label, 0),
+                    "rejected_queue_full": self.rejected.get(label, 0),
+                    "rejected_queue_timeout": self.timed_out.get(label, 0),
+                    "avg_queue_wait_ms": round(self._wait_total.get(label, 0.0) / self.admitted[label] * 1000, 2) if self.admitted.get(label) else 0.0,
+                    "max_queue_wait_ms": round(self._wait_max.get(label, 0.0) * 1000, 2)
+                }
+                for label in sorted(labels)
+            },
+            "priorities": {
+                priority: {
+                    "limit": self.limits[priority],
+                    "active": self._active_by_class[priority],
+                    "queued": len(self._queues[priority]),
+                    "preempted": self.preempted[priority],
+                    "wait_seconds": wait_percentiles.get(priority),
+                    "wait_histogram": dict(zip(bucket_names, self._histograms[priority]))
+                }
+                for priority in PRIORITY_CLASSES
+            }
+        }
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+百炼凭据池模块 - 在多组API密钥/应用ID之间分配调用，限流时临时摘除，并按方法选择模型档位
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from llm_control import LatencyTracker
+
+# 百炼限流时返回的HTTP状态码
+THROTTLE_STATUS_CODES = (429,)
+
+
+def is_throttled(error: Optional[BaseException]) -> bool:
+    """判断异常是否为上游限流"""
+    return getattr(error, "status_code", None) in THROTTLE_STATUS_CODES
+
+
+class Credential:
+    """一组API密钥和应用ID，以及它的权重、配额和调用状态"""
+
+    def __init__(self, api_key: str, app_id: str, weight: float = 1.0, rpm: int = 0):
+        self.api_key = api_key
+        self.app_id = app_id
+        self.weight = weight if weight > 0 else 1.0
+        # 每分钟请求配额，0表示不限制
+        self.rpm = rpm
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.consecutive_throttles = 0
+        self.ejected_until = 0.0
+        self._recent: Deque[float] = deque()
+
+    @property
+    def name(self) -> str:
+        """用于日志和指标的脱敏名称"""
+        return f"{self.app_id}/{self.api_key[-4:]}" if self.api_key else self.app_id
+
+    def requests_last_minute(self, now: float) -> int:
+        while self._recent and self._recent[0] <= now - 60:
+            self._recent.popleft()
+        return len(self._recent)
+
+    def over_quota(self, now: float) -> bool:
+        return self.rpm > 0 and self.requests_last_minute(now) >= self.rpm
+
+
+class CredentialPool:
+    """加权最少在途请求路由
+
+    - 选择 (在途请求数+1)/权重 最小的凭据
+    - 被限流的凭据摘除一段时间，连续限流时摘除时间翻倍
+    - 按滚动一分钟窗口统计每个凭据的请求量，达到配额的凭据暂不分配
+    - 所有凭据都不可用时，仍选择最先恢复的一个，由上游决定是否拒绝
+    """
+
+    def __init__(self, credentials: List[Credential], eject_seconds: float = 30.0, max_eject_seconds: float = 300.0):
+        self.credentials = credentials
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    @classmethod
+    def from_config(
+        cls,
+        spec: Optional[str],
+        api_key: Optional[str],
+        app_id: Optional[str],
+        **kwargs: Any
+    ) -> "CredentialPool":
+        """解析 "api_key:app_id[:权重[:每分钟配额]]" 逗号分隔的配置，未配置时使用单组密钥和应用ID"""
+        credentials = []
+        for item in (spec or "").split(","):
+            parts = [part.strip() for part in item.strip().split(":")]
+            if len(parts) < 2 or not parts[0] or not parts[1]:
+                if item.strip():
+                    print(f"⚠️  忽略格式错误的百炼凭据配置: {item.strip()[:8]}...")
+                continue
+            weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+            rpm = int(parts[3]) if len(parts) > 3 and parts[3] else 0
+            credentials.append(Credential(parts[0], parts[1], weight, rpm))
+
+        if not credentials and api_key and app_id:
+            credentials.append(Credential(api_key, app_id))
+        return cls(credentials, **kwargs)
+
+    def acquire(self) -> Credential:
+        """选择一个凭据并记为在途"""
+        if not self.credentials:
+            raise RuntimeError("未配置百炼API凭据")
+
+        now = time.time()
+        available = [c for c in self.credentials if c.ejected_until <= now and not c.over_quota(now)]
+        if available:
+            credential = min(available, key=lambda c: ((c.outstanding + 1) / c.weight, c.requests))
+        else:
+            credential = min(self.credentials, key=lambda c: (c.ejected_until, c.outstanding))
+
+        credential.outstanding += 1
+        credential.requests += 1
+        credential._recent.append(now)
+        return credential
+
+    def release(self, credential: Credential, error: Optional[BaseException] = None) -> bool:
+        """归还凭据；返回本次失败是否因为限流"""
+        credential.outstanding -= 1
+        if error is None:
+            credential.consecutive_throttles = 0
+            return False
+
+        credential.errors += 1
+        if not is_throttled(error):
+            return False
+
+        credential.throttled += 1
+        credential.consecutive_throttles += 1
+        duration = min(self.max_eject_seconds, self.eject_seconds * 2 ** (credential.consecutive_throttles - 1))
+        credential.ejected_until = time.time() + duration
+        print(f"⚠️  百炼凭据 {credential.name} 被限流，暂停使用{duration:.0f}秒")
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """返回每个凭据的权重、配额和调用统计"""
+        now = time.time()
+        return [
+            {
+                "name": c.name,
+                "weight": c.weight,
+                "rpm_quota": c.rpm or None,
+                "requests_last_minute": c.requests_last_minute(now),
+                "outstanding": c.outstanding,
+                "requests": c.requests,
+                "errors": c.errors,
+                "throttled": c.throttled,
+                "ejected_for": round(max(0.0, c.ejected_until - now), 1)
+            }
+            for c in self.credentials
+        ]
+
+
+class TierRouter:
+    """按方法选择模型/应用档位，首选档位的耗时分位或失败率超过阈值时改用其他档位
+
+    每个档位是一个独立的凭据池（对应百炼中配置了不同模型的应用）。
+    失败的调用（包括超时）按实际耗时计入耗时样本，同时计入失败率，卡住或持续出错的档位也会被绕开。
+    改道期间仍按 probe_every 的比例把请求发给首选档位，用新样本判断它是否恢复。
+    """
+
+    def __init__(
+        self,
+        pools: Dict[str, CredentialPool],
+        method_tiers: Dict[str, str],
+        latency_threshold: float = 0.0,
+        percentile: float = 95,
+        failure_rate: float = 0.5,
+        failure_window: int = 20,
+        probe_every: int = 10,
+        default_tier: str = "default"
+    ):
+        self.pools = pools
+        self.method_tiers = {method: tier for method, tier in method_tiers.items() if tier in pools}
+        self.latency_threshold = latency_threshold
+        self.percentile = percentile
+        self.failure_rate = failure_rate
+        self.failure_window = max(1, failure_window)
+        self.probe_every = max(1, probe_every)
+        self.default_tier = default_tier
+        self.tracker = LatencyTracker(window=100, min_samples=5)
+        self._outcomes: Dict[str, Deque[bool]] = {}
+
+        # 按方法统计路由结果
+        self.decisions: Dict[str, Dict[str, int]] = {}
+        self.reroutes: Dict[str, int] = {}
+        self._since_probe: Dict[str, int] = {}
+
+    def preferred(self, method: str) -> str:
+        return self.method_tiers.get(method, self.default_tier)
+
+    def _slow(self, tier: str) -> bool:
+        if self.latency_threshold <= 0:
+            return False
+        observed = self.tracker.percentile(tier, self.percentile)
+        return observed is not None and observed > self.latency_threshold
+
+    def _failures(self, tier: str) -> Optional[float]:
+        """档位最近调用的失败率，样本不足时返回None"""
+        outcomes = self._outcomes.get(tier)
+        if not outcomes or len(outcomes) < self.tracker.min_samples:
+            return None
+        return round(outcomes.count(False) / len(outcomes), 3)
+
+    def _unhealthy(self, tier: str) -> bool:
+        if self._slow(tier):
+            return True
+        failures = self._failures(tier)
+        return self.failure_rate > 0 and failures is not None and failures >= self.failure_rate
+
+    def choose(self, method: str) -> str:
+        """返回本次调用使用的档位，并记录路由决定"""
+        tier = self.preferred(method)
+        if self._unhealthy(tier):
+            probes = self._since_probe.get(method, 0) + 1
+            if probes >= self.probe_every:
+                # 定期放行一个请求到首选档位，刷新它的耗时样本
+                self._since_probe[method] = 0
+            else:
+                self._since_probe[method] = probes
+                alternatives = [name for name in self.pools if name != tier and not self._unhealthy(name)]
+                if alternatives:
+                    tier = min(alternatives, key=lambda name: self.tracker.percentile(name, self.percentile) or 0.0)
+                    self.reroutes[method] = self.reroutes.get(method, 0) + 1
+
+        counts = self.decisions.setdefault(method, {})
+        counts[tier] = counts.get(tier, 0) + 1
+        return tier
+
+    def pool(self, tier: str) -> CredentialPool:
+        return self.pools[tier]
+
+    def record(self, tier: str, seconds: float, ok: bool = True) -> None:
+        """记录档位一次调用的耗时和结果，失败的调用（如超时）同样计入耗时样本"""
+        self.tracker.record(tier, seconds)
+        outcomes = self._outcomes.get(tier)
+        if outcomes is None:
+            outcomes = self._outcomes[tier] = deque(maxlen=self.failure_window)
+        outcomes.append(ok)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回各档位耗时、方法到档位的映射和路由决定"""
+        return {
+            "method_tiers": dict(self.method_tiers),
+            "latency_threshold": self.latency_threshold,
+            "failure_rate_threshold": self.failure_rate,
+            "latency": self.tracker.stats(),
+            "failure_rates": {name: self._failures(name) for name in self.pools},
+            "decisions": {method: dict(counts) for method, counts in self.decisions.items()},
+            "reroutes": dict(self.reroutes),
+            "pools": {name: pool.stats() for name, pool in self.pools.items()}
+        }
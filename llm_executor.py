@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+LLM执行器模块 - 在有界线程池中运行阻塞的DashScope SDK调用
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class PoolSaturatedError(Exception):
+    """线程池和等待队列都已占满"""
+
+
+class BoundedThreadPool:
+    """有界线程池 - 让阻塞调用不再占住事件循环"""
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 64):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="dashscope"
+        )
+        self._lock = threading.Lock()
+
+        # 运行状态统计
+        self._queued = 0
+        self._active = 0
+        self._peak_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中执行func，队列已满时直接拒绝"""
+        with self._lock:
+            if self._queued + self._active >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"线程池已满: 执行中{self._active}, 排队{self._queued}"
+                )
+            self._queued += 1
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        enqueued_at = time.monotonic()
+        # dequeued[0]: 任务已离开等待队列（开始执行或被调用方放弃）
+        dequeued = [False]
+
+        def worker() -> Any:
+            with self._lock:
+                if dequeued[0]:
+                    return None
+                dequeued[0] = True
+                self._queued -= 1
+                self._active += 1
+                self._total_wait += time.monotonic() - enqueued_at
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, worker)
+        except BaseException as e:
+            with self._lock:
+                # 调用方在排队期间被取消时，释放占用的队列名额
+                if not dequeued[0]:
+                    dequeued[0] = True
+                    self._queued -= 1
+                if isinstance(e, Exception):
+                    self._failed += 1
+            raise
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """返回队列深度和线程池饱和度，用于调整池大小"""
+        with self._lock:
+            started = self._submitted - self._queued
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+                "peak_queued": self._peak_queued,
+                "saturation": round(self._active / self.max_workers, 3),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0
+            }
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+"""
+提示词模板模块 - 固定的说明和格式要求放在前面，本次请求的车次、站点等变量放在最后，
+使相同任务的请求共享尽可能长的前缀，便于服务端前缀缓存命中
+"""
+
+from typing import Any, Dict, Tuple
+
+
+class PromptTemplate:
+    """提示词模板：instructions 为固定前缀，query 为包含变量的结尾部分"""
+
+    def __init__(self, task: str, instructions: str, query: str):
+        self.task = task
+        self.instructions = instructions.strip()
+        self.query = query
+
+    def render(self, include_instructions: bool = True, **variables: Any) -> str:
+        """生成提示词；说明已配置在百炼应用的系统提示词中时，只发送任务名和变量"""
+        query = self.query.format(**variables)
+        if not include_instructions:
+            return f"任务：{self.task}\n{query}"
+        return f"{self.instructions}\n\n{query}"
+
+
+SEARCH_TRAINS = PromptTemplate(
+    task="查询车次",
+    instructions="""
+请根据最后给出的出发日期、出发地和目的地查询火车车次信息。
+
+要求：
+1. 列出3-8个不同时间段的车次选项
+2. 包含高铁、动车、普通列车等不同类型
+3. 返回JSON格式，包含以下字段：
+   - train_number: 车次号
+   - departure_time: 发车时间
+   - arrival_time: 到达时间
+   - duration: 运行时长
+   - price: 票价
+   - train_type: 车型(如：高速动车、动车、普快等)
+
+返回格式：
+[
+  {
+    "train_number": "G1",
+    "departure_time": "08:30",
+    "arrival_time": "14:25",
+    "duration": "5小时55分",
+    "price": "553元",
+    "train_type": "高速动车"
+  }
+]
+
+请确保返回有效的JSON数组格式。
+""",
+    query="查询条件：{departure_date}，从{origin}到{destination}"
+)
+
+ROUTE_RECOMMENDATIONS = PromptTemplate(
+    task="沿途推荐",
+    instructions="""
+请为最后给出的列车推荐沿途的风景名胜和特色美食。
+
+要求：
+1. 推荐3-5个沿途主要城市或景点
+2. 每个地点包括：景点名称、特色美食、简短描述
+3. 返回JSON格式，结构如下：
+{
+  "route_info": {
+    "train_no": "车次",
+    "from_station": "出发站",
+    "to_station": "到达站",
+    "travel_time": "约X小时"
+  },
+  "attractions": [
+    {
+      "city": "城市名",
+      "scenic_spots": ["景点1", "景点2"],
+      "local_food": ["美食1", "美食2"],
+      "description": "简短描述"
+    }
+  ],
+  "travel_tips": ["贴士1", "贴士2"]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+ROUTE_STATIONS = PromptTemplate(
+    task="途径站点",
+    instructions="""
+请查询最后给出的列车的详细途径站点信息。
+
+要求：
+1. 列出所有途径站点的详细信息
+2. 包含每个站点的经纬度坐标（用于地图标注）
+3. 包含到达时间、发车时间、停车时长、站序等信息
+4. 返回JSON格式，包含以下字段：
+
+返回格式：
+{
+  "train_info": {
+    "train_no": "车次",
+    "from_station": "出发站",
+    "to_station": "到达站",
+    "total_distance": "1318公里",
+    "total_time": "5小时55分"
+  },
+  "stations": [
+    {
+      "sequence": 1,
+      "name": "北京南站",
+      "arrival_time": "始发站",
+      "departure_time": "08:30",
+      "stop_duration": "0分钟",
+      "longitude": 116.378631,
+      "latitude": 39.865689,
+      "city": "北京",
+      "is_major": true,
+      "attractions": ["天安门广场", "故宫", "颐和园"],
+      "local_food": ["北京烤鸭", "炸酱面", "豆汁"]
+    },
+    {
+      "sequence": 2,
+      "name": "济南西站",
+      "arrival_time": "10:25",
+      "departure_time": "10:27",
+      "stop_duration": "2分钟",
+      "longitude": 116.823834,
+      "latitude": 36.671162,
+      "city": "济南",
+      "is_major": true,
+      "attractions": ["趵突泉", "大明湖", "千佛山"],
+      "local_food": ["把子肉", "甜沫", "油旋"]
+    }
+  ]
+}
+
+请确保返回有效的JSON格式，经纬度坐标要准确。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+ROUTE_BUNDLE = PromptTemplate(
+    task="路线综合信息",
+    instructions="""
+请查询最后给出的列车的途径站点，并推荐沿途城市的风景名胜和特色美食。
+
+要求：
+1. 列出所有途径站点，包含到达时间、发车时间、停车时长、站序和准确的经纬度坐标
+2. 为沿途3-5个主要城市推荐景点、特色美食和简短描述
+3. 给出2-4条旅行贴士
+4. 返回JSON格式，结构如下：
+{
+  "route_info": {
+    "train_no": "车次",
+    "from_station": "出发站",
+    "to_station": "到达站",
+    "travel_time": "5小时55分",
+    "total_distance": "1318公里"
+  },
+  "stations": [
+    {
+      "sequence": 1,
+      "name": "北京南站",
+      "arrival_time": "始发站",
+      "departure_time": "08:30",
+      "stop_duration": "0分钟",
+      "longitude": 116.378631,
+      "latitude": 39.865689,
+      "city": "北京",
+      "is_major": true
+    }
+  ],
+  "attractions": [
+    {
+      "city": "城市名",
+      "scenic_spots": ["景点1", "景点2"],
+      "local_food": ["美食1", "美食2"],
+      "description": "简短描述"
+    }
+  ],
+  "travel_tips": ["贴士1", "贴士2"]
+}
+
+请确保返回有效的JSON格式，经纬度坐标要准确。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+# 紧凑输出格式：站点写成按固定顺序排列的数组，由 expand_stations 还原为原有结构
+STATION_FIELDS = (
+    "sequence", "name", "arrival_time", "departure_time", "stop_duration",
+    "longitude", "latitude", "city", "is_major", "attractions", "local_food"
+)
+# 紧凑站点数组至少要包含的字段数（站序到是否主要站），更短的数组是模型写坏的行
+CORE_STATION_FIELDS = 9
+
+ROUTE_STATIONS_COMPACT = PromptTemplate(
+    task="途径站点(紧凑格式)",
+    instructions="""
+请查询最后给出的列车的详细途径站点信息。
+
+要求：
+1. 列出所有途径站点，包含站序、到达时间、发车时间、停车时长和准确的经纬度坐标（用于地图标注）
+2. 每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0), [景点...], [美食...]]
+   始发站的到达时间和终点站的发车时间写"-"
+3. 返回JSON格式，结构如下：
+{
+  "train_info": {
+    "train_no": "车次",
+    "from_station": "出发站",
+    "to_station": "到达站",
+    "total_distance": "1318公里",
+    "total_time": "5小时55分"
+  },
+  "stations": [
+    [1, "北京南站", "-", "08:30", 0, 116.378631, 39.865689, "北京", 1, ["天安门广场", "故宫"], ["北京烤鸭", "炸酱面"]],
+    [2, "济南西站", "10:25", "10:27", 2, 116.823834, 36.671162, "济南", 1, ["趵突泉", "大明湖"], ["把子肉", "油旋"]]
+  ]
+}
+
+请确保返回有效的JSON格式，经纬度坐标要准确。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+ROUTE_BUNDLE_COMPACT = PromptTemplate(
+    task="路线综合信息(紧凑格式)",
+    instructions="""
+请查询最后给出的列车的途径站点，并推荐沿途城市的风景名胜和特色美食。
+
+要求：
+1. 列出所有途径站点，每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0)]
+   始发站的到达时间和终点站的发车时间写"-"，经纬度坐标要准确
+2. 为沿途3-5个主要城市推荐景点、特色美食和简短描述
+3. 给出2-4条旅行贴士
+4. 返回JSON格式，结构如下：
+{
+  "route_info": {
+    "train_no": "车次",
+    "from_station": "出发站",
+    "to_station": "到达站",
+    "travel_time": "5小时55分",
+    "total_distance": "1318公里"
+  },
+  "stations": [
+    [1, "北京南站", "-", "08:30", 0, 116.378631, 39.865689, "北京", 1]
+  ],
+  "attractions": [
+    {
+      "city": "城市名",
+      "scenic_spots": ["景点1", "景点2"],
+      "local_food": ["美食1", "美食2"],
+      "description": "简短描述"
+    }
+  ],
+  "travel_tips": ["贴士1", "贴士2"]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+TRAIN_TIMETABLE = PromptTemplate(
+    task="全程时刻表",
+    instructions="""
+请列出最后给出的列车从始发站到终点站的全程停靠站（不要只列乘客查询的区间）。
+
+要求：
+1. 按运行顺序列出全部停靠站，包含到达时间、发车时间、停车时长和准确的经纬度坐标
+2. 每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0), [景点...], [美食...]]
+   始发站的到达时间和终点站的发车时间写"-"
+3. 返回JSON格式，结构如下：
+{
+  "train_no": "车次",
+  "stations": [
+    [1, "北京南站", "-", "08:30", 0, 116.378631, 39.865689, "北京", 1, ["天安门广场", "故宫"], ["北京烤鸭", "炸酱面"]],
+    [2, "济南西站", "10:25", "10:27", 2, 116.823834, 36.671162, "济南", 1, ["趵突泉", "大明湖"], ["把子肉", "油旋"]]
+  ]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次（乘客查询区间：{from_station}到{to_station}）"
+)
+
+TRAIN_TIMETABLE_SKELETON = PromptTemplate(
+    task="全程时刻表(仅站点)",
+    instructions="""
+请列出最后给出的列车从始发站到终点站的全程停靠站（不要只列乘客查询的区间），只需要时刻和坐标。
+
+要求：
+1. 按运行顺序列出全部停靠站，包含到达时间、发车时间、停车时长和准确的经纬度坐标
+2. 每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0)]
+   始发站的到达时间和终点站的发车时间写"-"
+3. 返回JSON格式，结构如下：
+{
+  "train_no": "车次",
+  "stations": [
+    [1, "北京南站", "-", "08:30", 0, 116.378631, 39.865689, "北京", 1],
+    [2, "济南西站", "10:25", "10:27", 2, 116.823834, 36.671162, "济南", 1]
+  ]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次（乘客查询区间：{from_station}到{to_station}）"
+)
+
+TIMETABLE_HUBS = PromptTemplate(
+    task="时刻表枢纽站",
+    instructions="""
+请给出最后给出的列车全程的停靠站总数，以及按运行顺序排列的枢纽站（始发站、终点站和沿途的省会或主要换乘站）。
+
+只列站名，不需要时刻和坐标。返回JSON格式：
+{
+  "train_no": "车次",
+  "total_stops": 32,
+  "hubs": ["北京西站", "石家庄站", "郑州站", "武汉站", "长沙站", "贵阳站", "昆明站"]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次"
+)
+
+TIMETABLE_SEGMENT = PromptTemplate(
+    task="时刻表区段",
+    instructions="""
+请列出最后给出的列车在指定区段内（包含区段两端）的全部停靠站。
+
+要求：
+1. 按运行顺序列出区段内的停靠站，包含到达时间、发车时间、停车时长和准确的经纬度坐标
+2. 每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0), [景点...], [美食...]]
+   区段两端按列车实际到发时刻填写，只有全程始发站的到达时间和全程终点站的发车时间写"-"
+3. 返回JSON格式，结构如下：
+{
+  "stations": [
+    [1, "郑州站", "12:02", "12:10", 8, 113.658097, 34.745795, "郑州", 1, ["少林寺"], ["烩面"]]
+  ]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次，区段：{from_station}到{to_station}"
+)
+
+TIMETABLE_SEGMENT_SKELETON = PromptTemplate(
+    task="时刻表区段(仅站点)",
+    instructions="""
+请列出最后给出的列车在指定区段内（包含区段两端）的全部停靠站，只需要时刻和坐标。
+
+要求：
+1. 按运行顺序列出区段内的停靠站，包含到达时间、发车时间、停车时长和准确的经纬度坐标
+2. 每个站点写成一个数组，字段顺序固定为：
+   [站序, 站名, 到达时间, 发车时间, 停车分钟数, 经度, 纬度, 城市, 是否主要站(1或0)]
+   区段两端按列车实际到发时刻填写，只有全程始发站的到达时间和全程终点站的发车时间写"-"
+3. 返回JSON格式，结构如下：
+{
+  "stations": [
+    [1, "郑州站", "12:02", "12:10", 8, 113.658097, 34.745795, "郑州", 1]
+  ]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次，区段：{from_station}到{to_station}"
+)
+
+CITY_CONTENT = PromptTemplate(
+    task="城市推荐",
+    instructions="""
+请为最后给出的城市推荐风景名胜和特色美食，内容与乘坐哪趟列车无关。
+
+要求：
+1. 推荐2-4个景点和2-4种特色美食，并用一句话描述这座城市
+2. 返回JSON格式，结构如下：
+{
+  "city": "城市名",
+  "scenic_spots": ["景点1", "景点2"],
+  "local_food": ["美食1", "美食2"],
+  "description": "简短描述"
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="城市：{city}"
+)
+
+TRAVEL_TIPS = PromptTemplate(
+    task="旅行贴士",
+    instructions="""
+请为乘坐最后给出的列车区间的旅客给出2-4条旅行贴士。
+
+返回JSON格式：
+{
+  "travel_tips": ["贴士1", "贴士2"]
+}
+
+请确保返回有效的JSON格式。
+""",
+    query="列车：{train_no}次，从{from_station}到{to_station}"
+)
+
+TEMPLATES = (
+    SEARCH_TRAINS, ROUTE_RECOMMENDATIONS,
+    ROUTE_STATIONS, ROUTE_BUNDLE, ROUTE_STATIONS_COMPACT, ROUTE_BUNDLE_COMPACT, TRAIN_TIMETABLE,
+    TRAIN_TIMETABLE_SKELETON, TIMETABLE_HUBS, TIMETABLE_SEGMENT, TIMETABLE_SEGMENT_SKELETON, CITY_CONTENT, TRAVEL_TIPS
+)
+
+
+def app_system_prompt() -> str:
+    """生成可配置到百炼应用中的系统提示词，包含所有任务的说明和格式要求"""
+    sections = [f"## 任务：{template.task}\n{template.instructions}" for template in TEMPLATES]
+    return "用户消息的第一行给出任务名，请按对应任务的要求处理其后的查询内容。\n\n" + "\n\n".join(sections)
+
+
+def _get(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def usage_tokens(usage: Any) -> Tuple[int, int]:
+    """从百炼响应的usage中取出(输入token数, 输出token数)，应用接口按模型分别统计"""
+    if not usage:
+        return 0, 0
+    models = _get(usage, "models") or [usage]
+    input_tokens = sum(int(_get(model, "input_tokens") or 0) for model in models)
+    output_tokens = sum(int(_get(model, "output_tokens") or 0) for model in models)
+    return input_tokens, output_tokens
+
+
+class PromptUsage:
+    """按方法统计提示词长度和上游返回的token用量"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, prompt: str, usage: Any) -> None:
+        input_tokens, output_tokens = usage_tokens(usage)
+        stats = self._stats.setdefault(label, {
+            "requests": 0, "prompt_chars": 0, "reported": 0, "input_tokens": 0, "output_tokens": 0
+        })
+        stats["requests"] += 1
+        stats["prompt_chars"] += len(prompt)
+        if input_tokens or output_tokens:
+            stats["reported"] += 1
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        """返回每个方法的平均提示词字符数和平均输入/输出token数"""
+        result: Dict[str, Any] = {}
+        for label, stats in self._stats.items():
+            reported = stats["reported"]
+            result[label] = {
+                "requests": stats["requests"],
+                "avg_prompt_chars": round(stats["prompt_chars"] / stats["requests"], 1),
+                "avg_input_tokens": round(stats["input_tokens"] / reported, 1) if reported else None,
+                "avg_output_tokens": round(stats["output_tokens"] / reported, 1) if reported else None,
+                "input_tokens": stats["input_tokens"],
+                "output_tokens": stats["output_tokens"]
+            }
+        return result
+
+
+def expand_station(item: Any) -> Any:
+    """把紧凑格式的站点数组还原为带字段名的站点；已经是对象时原样返回，字段不全的数组返回None"""
+    if not isinstance(item, list):
+        return item
+    if len(item) < CORE_STATION_FIELDS:
+        return None
+    station = dict(zip(STATION_FIELDS, item))
+    if station.get("arrival_time") in ("-", "", None):
+        station["arrival_time"] = "始发站"
+    if station.get("departure_time") in ("-", "", None):
+        station["departure_time"] = "终点站"
+    stop = station.get("stop_duration")
+    if isinstance(stop, (int, float)) and not isinstance(stop, bool):
+        station["stop_duration"] = f"{int(stop)}分钟"
+    if "is_major" in station:
+        station["is_major"] = bool(station["is_major"])
+    return station
+
+
+def expand_stations(items: Any) -> Any:
+    """还原站点列表，丢弃字段不全的站点数组"""
+    if not isinstance(items, list):
+        return items
+    stations = (expand_station(item) for item in items)
+    return [station for station in stations if station is not None]
+
+
+if __name__ == "__main__":
+    # 输出应用系统提示词，复制到百炼控制台后可设置 ALIBABA_AI_PROMPT_CONTEXT=app
+    print(app_system_prompt())
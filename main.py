@@ -5,7 +5,7 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, ValidationError
 from typing import List, Dict, Optional
 import os
@@ -14,6 +14,7 @@ import json
 from dotenv import load_dotenv
 
 from ai_client import ai_client
+from llm_control import AdmissionRejectedError
 from image_service import image_service
 
 # 配置日志
@@ -32,6 +33,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
+@app.on_event("startup")
+async def on_startup():
+    """启动时预热AI客户端连接"""
+    await ai_client.startup()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """关闭时释放AI客户端资源"""
+    await ai_client.shutdown()
+
 # 静态文件服务
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -51,6 +62,46 @@ class RouteStationsRequest(BaseModel):
     origin: str
     destination: str
 
+class RouteBundleRequest(BaseModel):
+    train_number: str
+    origin: str
+    destination: str
+
+def enhance_attractions(attractions: List[Dict]) -> List[Dict]:
+    """为景点和美食添加图片URL"""
+    enhanced_attractions = []
+    for attraction in attractions:
+        enhanced_attraction = {
+            'city': attraction['city'],
+            'description': attraction.get('description', ''),
+            'scenic_spots': [],
+            'local_food': []
+        }
+        
+        # 为景点添加图片
+        for i, spot in enumerate(attraction.get('scenic_spots', [])):
+            image_url = image_service.get_attraction_image(
+                spot, attraction['city'], i
+            )
+            enhanced_attraction['scenic_spots'].append({
+                'name': spot,
+                'image': image_url
+            })
+        
+        # 为美食添加图片
+        for i, food in enumerate(attraction.get('local_food', [])):
+            image_url = image_service.get_food_image(
+                food, attraction['city'], i
+            )
+            enhanced_attraction['local_food'].append({
+                'name': food,
+                'image': image_url
+            })
+        
+        enhanced_attractions.append(enhanced_attraction)
+    
+    return enhanced_attractions
+
 # 根路径 - 返回主页
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -115,9 +166,13 @@ async def health_check():
         # 检查高德地图API密钥状态
         amap_status = "configured" if AMAP_API_KEY else "not_configured"
         
+        # 百炼熔断器状态: closed 正常, open 暂停调用, half_open 探测恢复中
+        breaker_state = ai_client.breaker.state if ai_client.breaker else "disabled"
+        
         return {
             "status": "healthy",
             "ai_client": ai_status,
+            "ai_circuit_breaker": breaker_state,
             "image_service": image_status,
             "amap_service": amap_status,
             "version": "1.0.0"
@@ -129,6 +184,14 @@ async def health_check():
             "version": "1.0.0"
         }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """AI客户端运行指标（线程池队列深度、饱和度等）"""
+    return {
+        "status": "success",
+        "ai_client": ai_client.get_stats()
+    }
+
 @app.get("/api/config/map")
 async def get_map_config():
     """获取地图配置信息"""
@@ -205,9 +268,12 @@ async def search_trains(request: TrainSearchRequest):
         return {
             "status": "success", 
             "trains": trains,
-            "count": len(trains)
+            "count": len(trains),
+            "degraded": ai_client.degraded_reason()
         }
         
+    except AdmissionRejectedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索车次失败: {str(e)}")
 
@@ -298,46 +364,18 @@ async def get_route_info(request: RouteInfoRequest):
         
         # 为景点和美食添加图片URL
         if 'attractions' in route_data:
-            enhanced_attractions = []
-            for attraction in route_data['attractions']:
-                enhanced_attraction = {
-                    'city': attraction['city'],
-                    'description': attraction['description'],
-                    'scenic_spots': [],
-                    'local_food': []
-                }
-                
-                # 为景点添加图片
-                for i, spot in enumerate(attraction['scenic_spots']):
-                    image_url = image_service.get_attraction_image(
-                        spot, attraction['city'], i
-                    )
-                    enhanced_attraction['scenic_spots'].append({
-                        'name': spot,
-                        'image': image_url
-                    })
-                
-                # 为美食添加图片
-                for i, food in enumerate(attraction['local_food']):
-                    image_url = image_service.get_food_image(
-                        food, attraction['city'], i
-                    )
-                    enhanced_attraction['local_food'].append({
-                        'name': food,
-                        'image': image_url
-                    })
-                
-                enhanced_attractions.append(enhanced_attraction)
-            
-            route_data['attractions'] = enhanced_attractions
+            route_data['attractions'] = enhance_attractions(route_data['attractions'])
         
         # 统一返回格式
         return {
             "success": True,
             "data": route_data,
-            "message": "路线信息获取成功"
+            "message": "路线信息获取成功",
+            "degraded": ai_client.degraded_reason()
         }
         
+    except AdmissionRejectedError:
+        raise
     except Exception as e:
         logger.error(f"获取路线信息时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取路线信息失败: {str(e)}")
@@ -505,13 +543,78 @@ async def get_route_stations(request: RouteStationsRequest):
         return {
             "success": True,
             "data": stations_data,
-            "message": "站点信息获取成功"
+            "message": "站点信息获取成功",
+            "degraded": ai_client.degraded_reason()
         }
         
+    except AdmissionRejectedError:
+        raise
     except Exception as e:
         logger.error(f"获取站点信息时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取站点信息失败: {str(e)}")
 
+@app.post("/api/route-bundle")
+async def get_route_bundle(request: RouteBundleRequest):
+    """一次获取路线信息、旅行贴士、站点坐标和带图片的景点（单次LLM调用）"""
+    try:
+        logger.info(f"获取路线综合信息: {request.train_number} {request.origin} -> {request.destination}")
+        
+        train_info = {
+            "train_no": request.train_number,
+            "from_station": request.origin,
+            "to_station": request.destination
+        }
+        
+        bundle = await ai_client.get_route_bundle(train_info)
+        
+        logger.info(f"路线综合信息: 站点{len(bundle.get('stations', []))}个, 城市{len(bundle.get('attractions', []))}个")
+        
+        bundle['attractions'] = enhance_attractions(bundle.get('attractions', []))
+        
+        return {
+            "success": True,
+            "data": bundle,
+            "message": "路线综合信息获取成功",
+            "degraded": ai_client.degraded_reason()
+        }
+        
+    except AdmissionRejectedError:
+        raise
+    except Exception as e:
+        logger.error(f"获取路线综合信息时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"获取路线综合信息失败: {str(e)}")
+
+@app.get("/api/route-bundle/stream")
+async def stream_route_bundle(train_number: str, origin: str, destination: str):
+    """以Server-Sent Events流式返回路线综合信息，每个站点、城市、贴士生成后立即推送"""
+    logger.info(f"流式获取路线综合信息: {train_number} {origin} -> {destination}")
+    
+    train_info = {
+        "train_no": train_number,
+        "from_station": origin,
+        "to_station": destination
+    }
+    
+    async def event_stream():
+        try:
+            async for event, data in ai_client.stream_route_bundle(train_info):
+                if event == "city":
+                    data = enhance_attractions([data])[0]
+                elif event == "done":
+                    data['attractions'] = enhance_attractions(data.get('attractions', []))
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except AdmissionRejectedError as e:
+            yield f"event: error\ndata: {json.dumps({'message': str(e), 'retry_after': e.retry_after}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"流式获取路线综合信息时出错: {e}", exc_info=True)
+            yield f"event: error\ndata: {json.dumps(str(e), ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # 异常处理
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc: HTTPException):
@@ -525,6 +628,20 @@ async def not_found_handler(request: Request, exc: HTTPException):
         }
     )
 
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    """LLM调用排队已满或等待超时，返回503并提示重试时间"""
+    logger.warning(f"请求被准入控制拒绝: {request.url.path} {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "error",
+            "message": str(exc),
+            "path": str(request.url)
+        },
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.exception_handler(500)
 async def server_error_handler(request: Request, exc: HTTPException):
     """500错误处理"""
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+地名规范化模块 - 把用户输入的站名/城市名（北京、北京南站、Beijing South、beijingnan）映射到规范名称，用于构建缓存键
+"""
+
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_ALIASES_FILE = Path(__file__).with_name("station_aliases.json")
+
+# 站名中的方位字及其拼音和英文写法，“北京南”会同时登记 beijingnan 和 beijingsouth
+DIRECTIONS = {
+    "东": ("dong", "east"),
+    "南": ("nan", "south"),
+    "西": ("xi", "west"),
+    "北": ("bei", "north")
+}
+
+# 去掉后仍能在索引中找到时才剥离的后缀，按长度从长到短尝试
+SUFFIXES = ("火车站", "高铁站", "railwaystation", "trainstation", "station", "railway", "站", "市", "shi")
+
+# 规范化时去掉的分隔符: 空白、连字符、撇号(Xi'an)、间隔号
+_SEPARATORS = re.compile(r"[\s\-_'’·.]+")
+
+
+def _pinyin(name: str) -> Optional[str]:
+    """安装了 pypinyin 时返回不带声调的连写拼音，否则返回None"""
+    try:
+        from pypinyin import lazy_pinyin
+    except ImportError:
+        return None
+    return "".join(lazy_pinyin(name))
+
+
+def clean_name(name: Any) -> str:
+    """全角转半角、转小写并去掉空白和分隔符"""
+    return _SEPARATORS.sub("", unicodedata.normalize("NFKC", str(name or "")).lower())
+
+
+class PlaceNameIndex:
+    """别名到规范名称的哈希索引，启动时由别名表一次性构建，查询只做字典查找
+
+    别名表格式见 station_aliases.json:
+    - cities: {城市: {"pinyin": 拼音, "aliases": [其他写法]}}
+    - stations: {站名(不带“站”): {"city": 所在城市, "aliases": [其他写法]}}
+
+    站名“城市+方位字”的拼音和英文写法自动生成，不在表中的名称只做清洗和去掉结尾的“站”字。
+    """
+
+    def __init__(self, cities: Dict[str, Dict[str, Any]], stations: Dict[str, Dict[str, Any]]):
+        self._index: Dict[str, str] = {}
+        self.lookups = 0
+        self.misses = 0
+
+        # 城市的拼音和英文写法，用于生成站名别名
+        city_latin: Dict[str, List[str]] = {}
+        for city, entry in cities.items():
+            entry = entry or {}
+            aliases = [entry.get("pinyin") or _pinyin(city), *(entry.get("aliases") or [])]
+            city_latin[city] = [clean_name(alias) for alias in aliases if alias and clean_name(alias).isascii()]
+            self._add(city, [city, *aliases])
+
+        for station, entry in stations.items():
+            entry = entry or {}
+            generated = self._generated_aliases(station, entry.get("city"), city_latin)
+            self._add(station, [station, *generated, *(entry.get("aliases") or [])])
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "PlaceNameIndex":
+        """从JSON别名表构建索引，文件缺失或格式错误时返回空索引"""
+        path = Path(path) if path else DEFAULT_ALIASES_FILE
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  无法加载地名别名表 {path}: {e}")
+            data = {}
+        return cls(data.get("cities") or {}, data.get("stations") or {})
+
+    @staticmethod
+    def _generated_aliases(station: str, city: Optional[str], city_latin: Dict[str, List[str]]) -> List[str]:
+        """为“城市+方位字”形式的站名生成拼音和英文别名"""
+        if not city or not station.startswith(city):
+            return []
+        rest = station[len(city):]
+        if not rest:
+            return list(city_latin.get(city, []))
+        if rest not in DIRECTIONS:
+            return []
+        return [name + word for name in city_latin.get(city, []) for word in DIRECTIONS[rest]]
+
+    def _add(self, canonical: str, aliases: Iterable[Optional[str]]) -> None:
+        for alias in aliases:
+            key = clean_name(alias)
+            # 先登记的优先，站名不覆盖同名城市（“北京站”和“北京”归到同一个键）
+            if key and key not in self._index:
+                self._index[key] = canonical
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def canonical(self, name: Any) -> str:
+        """返回规范名称；未登记的名称返回清洗并去掉结尾“站”字后的结果"""
+        key = clean_name(name)
+        if not key:
+            return ""
+        self.lookups += 1
+
+        found = self._index.get(key)
+        if found is not None:
+            return found
+        for suffix in SUFFIXES:
+            if key.endswith(suffix) and len(key) > len(suffix):
+                found = self._index.get(key[:-len(suffix)])
+                if found is not None:
+                    return found
+
+        self.misses += 1
+        return key[:-1] if key.endswith("站") and len(key) > 1 else key
+
+    def stats(self) -> Dict[str, Any]:
+        """返回索引大小和查询命中情况"""
+        return {
+            "aliases": len(self._index),
+            "lookups": self.lookups,
+            "unknown": self.misses,
+            "hit_rate": round(1 - self.misses / self.lookups, 3) if self.lookups else None
+        }
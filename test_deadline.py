@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+时间预算测试脚本 - 超出预算时的快速降级与后台完成
+"""
+
+import asyncio
+import json
+import os
+from unittest import mock
+
+from ai_client import AlibabaAIClient
+from llm_cache import make_cache_key
+
+ENV = {
+    "ALIBABA_DASHSCOPE_API_KEY": "test-key",
+    "ALIBABA_DASHSCOPE_APP_ID": "test-app",
+    "ALIBABA_AI_DISK_CACHE_ENABLED": "false",
+    "ALIBABA_AI_HEDGE_ENABLED": "false",
+    "ALIBABA_AI_BREAKER_ENABLED": "false",
+    "ALIBABA_AI_BUDGET_SEARCH_TRAINS": "0.1"
+}
+
+TRAINS = [{"train_no": "G1", "departure_time": "09:00", "arrival_time": "13:28"}]
+KEY = make_cache_key("search_trains", from_station="北京", to_station="上海", departure_date="2026-10-20")
+
+
+class SlowUpstream:
+    """替代百炼接口，延迟delay秒后返回正常结果"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return json.dumps(TRAINS, ensure_ascii=False)
+
+
+def _make_client(delay, **env):
+    """按测试配置创建客户端，上游替换为SlowUpstream"""
+    with mock.patch.dict(os.environ, dict(ENV, **env)):
+        client = AlibabaAIClient()
+    client._call_api = SlowUpstream(delay)
+    return client, client._call_api
+
+
+async def _search(client):
+    """在独立上下文中查询，返回(结果, 降级原因)"""
+    async def run():
+        trains = await client.search_trains("北京", "上海", "2026-10-20")
+        return trains, client.degraded_reason()
+    return await asyncio.create_task(run())
+
+
+def test_budget_fallback():
+    """测试超出预算时立即返回降级数据，后台调用完成后写入缓存"""
+    print("🔍 测试时间预算降级...")
+
+    async def run(singleflight):
+        client, upstream = _make_client(0.3, ALIBABA_AI_SINGLEFLIGHT_ENABLED=singleflight)
+        started = asyncio.get_running_loop().time()
+        trains, reason = await _search(client)
+        assert asyncio.get_running_loop().time() - started < 0.25
+        assert reason == "deadline" and trains == client._get_mock_trains()
+        assert client.deadline_fallbacks == {"search_trains": 1}
+
+        await asyncio.sleep(0.3)
+        trains, reason = await _search(client)
+        assert trains == TRAINS and reason is None and upstream.calls == 1
+
+    for singleflight in ("true", "false"):
+        asyncio.run(run(singleflight))
+    print("✅ 调用方按预算返回，上游调用照常完成并缓存")
+    return True
+
+
+def test_budget_prefers_stale():
+    """测试超出预算时优先返回已过期的真实数据"""
+    print("\n🔍 测试过期数据降级...")
+
+    async def run():
+        client, _ = _make_client(0.3)
+        client.cache.set(KEY, TRAINS, ttl=0.01)
+        await asyncio.sleep(0.02)
+
+        trains, reason = await _search(client)
+        assert trains == TRAINS and reason == "deadline"
+
+    asyncio.run(run())
+    print("✅ 过期的真实数据优先于模拟数据")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("⏱️ 时间预算测试")
+    print("=" * 60)
+
+    tests = [
+        test_budget_fallback,
+        test_budget_prefers_stale
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
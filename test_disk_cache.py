@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+持久化缓存测试脚本 - 落盘、跨实例读取与压缩
+"""
+
+import os
+import tempfile
+import time
+
+from llm_cache import DiskCache, make_cache_key
+
+
+def test_survives_restart():
+    """测试写入落盘后新实例仍可读取"""
+    print("🔍 测试重启后读取...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.sqlite3")
+        key = make_cache_key("get_route_stations", "G1", "北京南", "上海虹桥")
+        cache = DiskCache(path, flush_interval=60)
+        cache.set(key, {"stations": [{"name": "北京南站"}]}, ttl=60)
+
+        # 落盘前从待写队列读取
+        value, expires_at = cache.get(key)
+        assert value == {"stations": [{"name": "北京南站"}]} and expires_at > time.time()
+        cache.close()
+
+        reopened = DiskCache(path, flush_interval=60)
+        assert reopened.get(key)[0] == {"stations": [{"name": "北京南站"}]}
+        assert reopened.get(make_cache_key("get_route_stations", "G2")) is None
+        stats = reopened.stats()
+        assert stats["rows"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+        reopened.close()
+    print("✅ 数据跨实例保留")
+    return True
+
+
+def test_expired_entries():
+    """测试过期条目只在降级读取时返回，压缩后删除"""
+    print("\n🔍 测试过期与压缩...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(os.path.join(tmp, "llm_cache.sqlite3"), flush_interval=60)
+        key = make_cache_key("search_trains", "", "北京", "上海", "2026-10-20")
+        cache.set(key, [{"train_no": "G1"}], ttl=0.05)
+        cache.flush()
+        time.sleep(0.1)
+
+        assert cache.get(key) is None
+        assert cache.get(key, allow_stale=True)[0] == [{"train_no": "G1"}]
+        cache.compact()
+        assert cache.get(key, allow_stale=True) is None
+        cache.close()
+    print("✅ 过期条目可降级读取，压缩后清理")
+    return True
+
+
+def test_compact_over_capacity():
+    """测试超出容量时先淘汰最早过期的条目"""
+    print("\n🔍 测试容量压缩...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(os.path.join(tmp, "llm_cache.sqlite3"), max_bytes=150, flush_interval=60)
+        keys = [make_cache_key("get_route_bundle", f"G{i}") for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.set(key, {"tips": "x" * 60}, ttl=60 + i)
+        cache.flush()
+        cache.compact()
+
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[1]) is not None and cache.get(keys[2]) is not None
+        assert cache.stats()["bytes"] <= 150
+        cache.close()
+    print("✅ 按最早过期时间淘汰")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("💾 持久化缓存测试")
+    print("=" * 60)
+
+    tests = [
+        test_survives_restart,
+        test_expired_entries,
+        test_compact_over_capacity
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+流式JSON扫描测试脚本 - 逐段输入与截断修复
+"""
+
+import json
+
+from json_stream import JSONStreamScanner, extract_json_checked
+
+ROUTE = {
+    "route_info": {"train_no": "G101", "total_time": "4小时48分"},
+    "stations": [
+        {"name": "北京南站", "attractions": [{"name": "天坛"}]},
+        {"name": "济南西站", "attractions": [{"name": "趵突泉"}]},
+        {"name": "南京南站", "attractions": [{"name": "中山陵"}]}
+    ]
+}
+
+
+def test_stream_events():
+    """测试逐字符输入时按顶层字段和数组元素产出事件"""
+    print("🔍 测试流式事件...")
+    text = "以下是结果：\n```json\n" + json.dumps(ROUTE, ensure_ascii=False) + "\n```"
+    scanner = JSONStreamScanner()
+    events = []
+    for char in text:
+        events.extend(scanner.feed(char))
+
+    assert events[0] == ("field", "route_info", ROUTE["route_info"])
+    assert [value["name"] for kind, key, value in events if kind == "item" and key == "stations"] == ["北京南站", "济南西站", "南京南站"]
+    assert scanner.done and scanner.result() == ROUTE
+    print("✅ 事件顺序和最终结果正确")
+    return True
+
+
+def test_truncated_repair():
+    """测试截断在站点中间时丢弃写了一半的站点"""
+    print("\n🔍 测试截断修复...")
+    text = json.dumps(ROUTE, ensure_ascii=False)
+    cut = text.index("趵突泉") + 2
+
+    value, complete = extract_json_checked(text[:cut])
+    assert not complete
+    assert value["route_info"] == ROUTE["route_info"]
+    assert [station["name"] for station in value["stations"]] == ["北京南站"]
+
+    value, complete = extract_json_checked(text)
+    assert complete and value == ROUTE
+    print("✅ 只保留完整的站点，并标记结果不完整")
+    return True
+
+
+def test_truncated_nested_array():
+    """测试数组中的数组元素被截断时整体丢弃该元素"""
+    print("\n🔍 测试紧凑数组截断...")
+    value, complete = extract_json_checked('{"stations": [[1, "北京南站", "始发站"], [2, "济南西站", "09:')
+    assert not complete
+    assert value == {"stations": [[1, "北京南站", "始发站"]]}
+
+    assert extract_json_checked("没有JSON的回复") == (None, True)
+    print("✅ 写了一半的数组元素被丢弃")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🧩 流式JSON扫描测试")
+    print("=" * 60)
+
+    tests = [
+        test_stream_events,
+        test_truncated_repair,
+        test_truncated_nested_array
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
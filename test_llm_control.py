@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+LLM调用控制测试脚本 - 并发请求合并、对冲请求、熔断器、准入控制与优先级调度
+"""
+
+import asyncio
+import time
+
+from llm_control import (
+    AdmissionController, AdmissionRejectedError, CircuitBreaker, CircuitOpenError,
+    HedgedRunner, LatencyTracker, SingleFlight
+)
+
+
+def test_singleflight_collapses():
+    """测试相同键的并发调用只执行一次，不同键互不影响"""
+    print("🔍 测试请求合并...")
+    calls = []
+
+    async def fetch(name):
+        calls.append(name)
+        await asyncio.sleep(0.05)
+        return {"train_no": name}
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            *(flight.do("G1", lambda: fetch("G1"), label="get_route_stations") for _ in range(5)),
+            flight.do("G2", lambda: fetch("G2"), label="get_route_stations")
+        )
+        assert calls == ["G1", "G2"]
+        assert results[:5] == [{"train_no": "G1"}] * 5 and results[5] == {"train_no": "G2"}
+
+        stats = flight.stats()
+        assert stats["in_flight"] == 0
+        assert stats["executed"] == {"get_route_stations": 2} and stats["collapsed"] == {"get_route_stations": 4}
+
+        # 完成后再次调用重新执行
+        await flight.do("G1", lambda: fetch("G1"))
+        assert calls == ["G1", "G2", "G1"]
+
+    asyncio.run(run())
+    print("✅ 并发的相同请求共享一次调用")
+    return True
+
+
+def test_singleflight_errors_and_cancel():
+    """测试异常传递给所有等待者，发起者取消不影响其他等待者"""
+    print("\n🔍 测试异常与取消...")
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream unavailable")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("G1", fail), flight.do("G1", fail), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        leader = asyncio.ensure_future(flight.do("G2", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("G2", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "done"
+
+    asyncio.run(run())
+    print("✅ 异常共享，发起者取消后调用继续")
+    return True
+
+
+def test_hedge_delay():
+    """测试对冲等待时间：样本不足时用默认值，否则取历史分位并不低于下限"""
+    print("\n🔍 测试对冲等待时间...")
+    tracker = LatencyTracker(min_samples=3)
+    hedger = HedgedRunner(tracker, percentile=95, min_delay=0.5, default_delay=8)
+    assert hedger.delay_for("get_route_bundle") == 8
+
+    for seconds in (1.0, 2.0, 3.0):
+        tracker.record("get_route_bundle", seconds)
+        tracker.record("search_trains", seconds / 10)
+    assert hedger.delay_for("get_route_bundle") == 3.0
+    assert hedger.delay_for("search_trains") == 0.5
+    print("✅ 等待时间跟随历史耗时")
+    return True
+
+
+def test_hedge_wins():
+    """测试主调用卡住时对冲请求先返回，并取消主调用"""
+    print("\n🔍 测试对冲请求...")
+    attempts = []
+
+    async def fetch():
+        attempts.append(len(attempts))
+        try:
+            await asyncio.sleep(1.0 if len(attempts) == 1 else 0.01)
+        except asyncio.CancelledError:
+            attempts.append("cancelled")
+            raise
+        return "ok"
+
+    async def run():
+        hedger = HedgedRunner(LatencyTracker(), default_delay=0.05)
+        assert await hedger.run("get_route_bundle", fetch) == "ok"
+        await asyncio.sleep(0)
+        assert attempts == [0, 1, "cancelled"]
+        assert hedger.stats()["hedges"] == {"get_route_bundle": 1}
+        assert hedger.stats()["hedge_wins"] == {"get_route_bundle": 1}
+
+        # 对冲请求失败时仍等待主调用
+        attempts.clear()
+
+        async def hedge_fails():
+            attempts.append(len(attempts))
+            if len(attempts) == 2:
+                raise RuntimeError("upstream unavailable")
+            await asyncio.sleep(0.1)
+            return "primary"
+
+        assert await hedger.run("search_trains", hedge_fails) == "primary"
+        assert hedger.stats()["hedge_wins"].get("search_trains") is None
+
+    asyncio.run(run())
+    print("✅ 先成功的结果胜出，另一个被取消")
+    return True
+
+
+def test_breaker_trips_and_recovers():
+    """测试错误率超过阈值时打开，到期后半开探测，探测全部成功后关闭"""
+    print("\n🔍 测试熔断器状态切换...")
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, open_duration=0.05, half_open_probes=2)
+    for success in (True, False, True):
+        breaker.record(breaker.acquire(), success, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(breaker.acquire(), False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allows_requests()
+    try:
+        breaker.acquire()
+        assert False, "打开状态应拒绝调用"
+    except CircuitOpenError:
+        pass
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    probes = [breaker.acquire(), breaker.acquire()]
+    assert probes == [True, True] and not breaker.allows_requests()
+    for probe in probes:
+        breaker.record(probe, True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    stats = breaker.stats()
+    assert stats["opens"] == 1 and stats["rejected"] == 1 and stats["window_calls"] == 0
+    print("✅ 关闭→打开→半开→关闭")
+    return True
+
+
+def test_breaker_probe_failure_and_slow_calls():
+    """测试探测失败重新打开，慢调用率过高也会打开"""
+    print("\n🔍 测试探测失败与慢调用...")
+    breaker = CircuitBreaker(min_calls=2, open_duration=0.05, slow_call_threshold=1.0, slow_call_rate=0.5)
+    breaker.record(breaker.acquire(), True, 2.0)
+    breaker.record(breaker.acquire(), True, 2.0)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.last_trip_reason == "慢调用率2/2"
+
+    time.sleep(0.06)
+    probe = breaker.acquire()
+    breaker.record(probe, False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opens == 2
+
+    # 被取消的探测请求归还名额
+    time.sleep(0.06)
+    breaker.release(breaker.acquire())
+    assert breaker.allows_requests()
+    print("✅ 探测失败重新打开，慢调用同样计入")
+    return True
+
+
+def test_admission_limits():
+    """测试并发名额用满后排队，队列已满或排队超时时拒绝"""
+    print("\n🔍 测试准入控制...")
+
+    async def run():
+        admission = AdmissionController(max_concurrency=2, max_queue=1, queue_timeout=0.05, retry_after=3)
+        await admission.acquire("search_trains")
+        await admission.acquire("search_trains")
+
+        queued = asyncio.ensure_future(admission.acquire("get_route_bundle"))
+        await asyncio.sleep(0)
+        assert admission.stats()["queued"] == 1
+        try:
+            await admission.acquire("get_route_bundle")
+            assert False, "队列已满时应拒绝"
+        except AdmissionRejectedError as e:
+            assert e.retry_after == 3
+
+        # 名额释放后排队的调用立即开始
+        admission.release()
+        assert await queued == "interactive"
+        assert admission.stats()["active"] == 2
+
+        try:
+            await admission.acquire("get_route_bundle")
+            assert False, "排队超时应拒绝"
+        except AdmissionRejectedError:
+            pass
+
+        endpoints = admission.stats()["endpoints"]
+        assert endpoints["search_trains"]["admitted"] == 2
+        assert endpoints["get_route_bundle"]["admitted"] == 1
+        assert endpoints["get_route_bundle"]["rejected_queue_full"] == 1
+        assert endpoints["get_route_bundle"]["rejected_queue_timeout"] == 1
+
+    asyncio.run(run())
+    print("✅ 超出并发排队，队列满或超时返回503")
+    return True
+
+
+def test_admission_cancelled_waiter():
+    """测试排队中被取消的调用不占用名额"""
+    print("\n🔍 测试取消排队...")
+
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=1)
+        async with admission.slot("search_trains"):
+            waiter = asyncio.ensure_future(admission.acquire("search_trains"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+        assert admission.stats()["active"] == 0 and admission.stats()["queued"] == 0
+
+    asyncio.run(run())
+    print("✅ 取消的调用离开队列，名额全部归还")
+    return True
+
+
+def test_priority_order_and_shares():
+    """测试名额优先分给高优先级等待者，后台任务不超过自己的并发份额"""
+    print("\n🔍 测试优先级调度...")
+    order = []
+
+    async def run():
+        admission = AdmissionController(max_concurrency=2, max_queue=8, queue_timeout=1, shares={"refresh": 0.5})
+        assert admission.limits == {"interactive": 2, "prefetch": 2, "refresh": 1}
+        await admission.acquire("get_route_bundle", "refresh")
+
+        # 还有空闲名额，但refresh已用满份额
+        refresh = asyncio.ensure_future(admission.acquire("get_route_bundle", "refresh"))
+        await asyncio.sleep(0)
+        assert not refresh.done()
+        await admission.acquire("search_trains", "interactive")
+
+        async def waiter(label, priority):
+            await admission.acquire(label, priority)
+            order.append(label)
+
+        prefetch = asyncio.ensure_future(waiter("prefetch", "prefetch"))
+        interactive = asyncio.ensure_future(waiter("interactive", "interactive"))
+        await asyncio.sleep(0)
+        admission.release("interactive")
+        await asyncio.sleep(0)
+        admission.release("interactive")
+        await asyncio.gather(prefetch, interactive)
+        assert order == ["interactive", "prefetch"]
+
+        admission.release("interactive")
+        admission.release("prefetch")
+        admission.release("refresh")
+        assert await refresh == "refresh"
+
+    asyncio.run(run())
+    print("✅ 高优先级先获得名额，后台份额生效")
+    return True
+
+
+def test_preempt_and_promote():
+    """测试队列已满时挤掉低优先级等待者，以及排队中的调用被提升优先级"""
+    print("\n🔍 测试挤出与提升...")
+
+    async def run():
+        admission = AdmissionController(max_concurrency=1, max_queue=2, queue_timeout=1)
+        await admission.acquire("search_trains")
+
+        prefetch = asyncio.ensure_future(admission.acquire("get_route_bundle", "prefetch", tag="G1"))
+        refresh = asyncio.ensure_future(admission.acquire("get_route_bundle", "refresh", tag="G2"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(admission.acquire("search_trains", "interactive"))
+        await asyncio.sleep(0)
+        try:
+            await refresh
+            assert False, "低优先级等待者应被挤出"
+        except AdmissionRejectedError:
+            pass
+        assert admission.stats()["priorities"]["refresh"]["preempted"] == 1
+
+        # 队列中有同级等待者时，被提升的调用排在它后面
+        admission.promote("G1", "interactive")
+        assert admission.stats()["priorities"]["interactive"]["queued"] == 2
+        admission.release()
+        assert await interactive == "interactive"
+        admission.release()
+        assert await prefetch == "interactive"
+
+        # 低优先级请求在队列满时直接拒绝
+        admission.max_queue = 0
+        try:
+            await admission.acquire("get_route_bundle", "refresh")
+            assert False, "队列已满时应拒绝"
+        except AdmissionRejectedError:
+            pass
+        admission.release("interactive")
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(run())
+    print("✅ 挤出低优先级队尾，提升后按新优先级放行")
+    return True
+
+
+def test_singleflight_escalation():
+    """测试更高优先级的调用方加入共享调用时提升其优先级"""
+    print("\n🔍 测试共享调用优先级提升...")
+    escalations = []
+
+    async def run():
+        flight = SingleFlight(on_escalate=lambda key, priority: escalations.append((key, priority)))
+        seen = []
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            seen.append(flight.priority("G1"))
+            return "ok"
+
+        leader = asyncio.ensure_future(flight.do("G1", fetch, priority="refresh"))
+        await asyncio.sleep(0)
+        assert flight.priority("G1") == "refresh"
+        await asyncio.gather(
+            leader,
+            flight.do("G1", fetch, priority="interactive"),
+            flight.do("G1", fetch, priority="prefetch")
+        )
+        assert seen == ["interactive"]
+        assert escalations == [("G1", "interactive")]
+        assert flight.priority("G1") is None
+
+    asyncio.run(run())
+    print("✅ 共享调用取等待者中最高的优先级")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🎛️ LLM调用控制测试")
+    print("=" * 60)
+
+    tests = [
+        test_singleflight_collapses,
+        test_singleflight_errors_and_cancel,
+        test_hedge_delay,
+        test_hedge_wins,
+        test_breaker_trips_and_recovers,
+        test_breaker_probe_failure_and_slow_calls,
+        test_admission_limits,
+        test_admission_cancelled_waiter,
+        test_priority_order_and_shares,
+        test_preempt_and_promote,
+        test_singleflight_escalation
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+百炼凭据池测试脚本 - 加权选择、限流摘除、配额与档位路由
+"""
+
+import time
+
+from llm_credentials import Credential, CredentialPool, TierRouter
+
+
+class UpstreamError(Exception):
+    """带HTTP状态码的上游错误"""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_from_config():
+    """测试解析多组凭据配置，未配置时回退到单组密钥"""
+    print("🔍 测试凭据配置解析...")
+    pool = CredentialPool.from_config("key-a:app-a:3, key-b:app-b::60, broken", "key", "app")
+    assert [(c.app_id, c.weight, c.rpm) for c in pool.credentials] == [("app-a", 3.0, 0), ("app-b", 1.0, 60)]
+
+    pool = CredentialPool.from_config("", "key", "app")
+    assert len(pool) == 1 and pool.credentials[0].name == "app/key"
+    assert len(CredentialPool.from_config(None, None, None)) == 0
+    print("✅ 配置解析正确，格式错误的条目被忽略")
+    return True
+
+
+def test_weighted_choice():
+    """测试按 (在途请求数+1)/权重 选择凭据"""
+    print("\n🔍 测试加权选择...")
+    heavy, light = Credential("key-a", "app-a", weight=3), Credential("key-b", "app-b", weight=1)
+    pool = CredentialPool([heavy, light])
+
+    chosen = [pool.acquire() for _ in range(4)]
+    assert [c.app_id for c in chosen] == ["app-a", "app-a", "app-b", "app-a"]
+    assert (heavy.outstanding, light.outstanding) == (3, 1)
+
+    # 归还后在途请求数减少，重新按比例分配
+    for credential in chosen:
+        pool.release(credential)
+    assert (heavy.outstanding, light.outstanding) == (0, 0)
+    assert pool.acquire() is heavy
+    print("✅ 权重高的凭据承担更多在途请求")
+    return True
+
+
+def test_throttle_ejection():
+    """测试限流时摘除凭据且连续限流时间翻倍，其他错误不摘除"""
+    print("\n🔍 测试限流摘除...")
+    first, second = Credential("key-a", "app-a"), Credential("key-b", "app-b")
+    pool = CredentialPool([first, second], eject_seconds=30, max_eject_seconds=50)
+
+    credential = pool.acquire()
+    assert credential is first
+    assert pool.release(credential, UpstreamError(500)) is False
+    assert first.ejected_until == 0.0 and first.errors == 1
+
+    # 在途请求数相同时选择请求总数较少的凭据
+    credential = pool.acquire()
+    assert credential is second
+    assert pool.release(credential, UpstreamError(429)) is True
+    assert 29 <= second.ejected_until - time.time() <= 30
+    held = [pool.acquire() for _ in range(3)]
+    assert all(credential is first for credential in held)
+    for credential in held:
+        pool.release(credential)
+
+    # 恢复后再次限流，摘除时间翻倍但不超过上限
+    second.ejected_until = 0.0
+    credential = pool.acquire()
+    assert credential is second
+    pool.release(credential, UpstreamError(429))
+    assert second.consecutive_throttles == 2
+    assert 49 <= second.ejected_until - time.time() <= 50
+
+    # 所有凭据都被摘除时选择最先恢复的一个
+    first.ejected_until = second.ejected_until + 10
+    assert pool.acquire() is second
+
+    stats = pool.stats()
+    assert stats[0]["errors"] == 1 and stats[0]["throttled"] == 0
+    assert stats[1]["errors"] == 2 and stats[1]["throttled"] == 2
+    print("✅ 限流的凭据暂停使用，摘除时间翻倍并有上限")
+    return True
+
+
+def test_rpm_quota():
+    """测试达到每分钟配额的凭据暂不分配"""
+    print("\n🔍 测试每分钟配额...")
+    limited, spare = Credential("key-a", "app-a", weight=10, rpm=2), Credential("key-b", "app-b")
+    pool = CredentialPool([limited, spare])
+
+    for _ in range(2):
+        pool.release(pool.acquire())
+    assert pool.acquire() is spare
+    assert pool.stats()[0]["requests_last_minute"] == 2
+    print("✅ 配额用完后改用其他凭据")
+    return True
+
+
+def _router(**kwargs):
+    """两个档位的路由器：路线综合数据首选 quality 档位"""
+    pools = {
+        "quality": CredentialPool([Credential("key-a", "app-quality")]),
+        "fast": CredentialPool([Credential("key-b", "app-fast")])
+    }
+    return TierRouter(pools, {"get_route_bundle": "quality", "search_trains": "missing"}, default_tier="fast", **kwargs)
+
+
+def test_tier_reroute_on_latency():
+    """测试首选档位耗时分位超过阈值时改道，并定期放行探测请求"""
+    print("\n🔍 测试慢档位改道...")
+    router = _router(latency_threshold=5, probe_every=3)
+    assert router.method_tiers == {"get_route_bundle": "quality"}
+    assert router.choose("search_trains") == "fast"
+
+    for _ in range(5):
+        router.record("quality", 8.0)
+    assert [router.choose("get_route_bundle") for _ in range(3)] == ["fast", "fast", "quality"]
+    assert router.reroutes == {"get_route_bundle": 2}
+
+    # 首选档位恢复后不再改道
+    for _ in range(100):
+        router.record("quality", 1.0)
+    assert router.choose("get_route_bundle") == "quality"
+    assert router.stats()["decisions"]["get_route_bundle"] == {"fast": 2, "quality": 2}
+    print("✅ 慢档位被绕开，恢复后回到首选档位")
+    return True
+
+
+def test_tier_reroute_on_failures():
+    """测试失败率超过阈值时改道，其他档位同样不健康时保持首选"""
+    print("\n🔍 测试失败档位改道...")
+    router = _router(failure_rate=0.5, failure_window=10)
+    for ok in (True, False, False, True, False):
+        router.record("quality", 0.5, ok=ok)
+    assert router.stats()["failure_rates"] == {"quality": 0.6, "fast": None}
+    assert router.choose("get_route_bundle") == "fast"
+
+    for _ in range(5):
+        router.record("fast", 0.5, ok=False)
+    assert router.choose("get_route_bundle") == "quality"
+
+    # 失败率按最近的调用计算
+    for _ in range(10):
+        router.record("quality", 0.5)
+    assert router.stats()["failure_rates"]["quality"] == 0.0
+    print("✅ 持续失败的档位被绕开")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🔑 百炼凭据池测试")
+    print("=" * 60)
+
+    tests = [
+        test_from_config,
+        test_weighted_choice,
+        test_throttle_ejection,
+        test_rpm_quota,
+        test_tier_reroute_on_latency,
+        test_tier_reroute_on_failures
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+失败结果缓存测试脚本 - 降级数据短期缓存与连续失败退避
+"""
+
+import asyncio
+import json
+import os
+from unittest import mock
+
+from ai_client import AlibabaAIClient
+from llm_cache import make_cache_key
+
+ENV = {
+    "ALIBABA_DASHSCOPE_API_KEY": "test-key",
+    "ALIBABA_DASHSCOPE_APP_ID": "test-app",
+    "ALIBABA_AI_DISK_CACHE_ENABLED": "false",
+    "ALIBABA_AI_HEDGE_ENABLED": "false",
+    "ALIBABA_AI_BREAKER_ENABLED": "false",
+    "ALIBABA_AI_NEGATIVE_CACHE_TTL": "0.2",
+    "ALIBABA_AI_NEGATIVE_CACHE_MAX_TTL": "0.5"
+}
+
+TRAINS = [{"train_no": "G1", "departure_time": "09:00", "arrival_time": "13:28"}]
+KEY = make_cache_key("search_trains", from_station="北京", to_station="上海", departure_date="2026-10-20")
+
+
+class FakeUpstream:
+    """替代百炼接口，按mode返回错误、无法解析的文本或正常结果"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.calls = 0
+
+    async def __call__(self, prompt):
+        self.calls += 1
+        if self.mode == "error":
+            raise RuntimeError("upstream unavailable")
+        if self.mode == "garbage":
+            return "抱歉，暂时无法查询"
+        return json.dumps(TRAINS, ensure_ascii=False)
+
+
+def _make_client(mode):
+    """按测试配置创建客户端，上游替换为FakeUpstream"""
+    with mock.patch.dict(os.environ, ENV):
+        client = AlibabaAIClient()
+    client._call_api = FakeUpstream(mode)
+    return client, client._call_api
+
+
+async def _search(client):
+    """在独立上下文中查询，返回(结果, 降级原因)"""
+    async def run():
+        trains = await client.search_trains("北京", "上海", "2026-10-20")
+        return trains, client.degraded_reason()
+    return await asyncio.create_task(run())
+
+
+def test_failure_cached():
+    """测试失败后的降级结果在短TTL内直接返回，不再调用上游"""
+    print("🔍 测试失败结果缓存...")
+
+    async def run():
+        client, upstream = _make_client("error")
+
+        first, reason = await _search(client)
+        assert reason == "error" and first == client._get_mock_trains()
+        second, reason = await _search(client)
+        assert reason == "error" and second == first
+        assert upstream.calls == 1
+
+        await asyncio.sleep(0.25)
+        await _search(client)
+        assert upstream.calls == 2
+
+    asyncio.run(run())
+    print("✅ TTL内相同请求不再调用上游")
+    return True
+
+
+def test_backoff_and_recovery():
+    """测试连续失败时TTL翻倍，成功后清除失败记录"""
+    print("\n🔍 测试连续失败退避...")
+
+    async def run():
+        client, upstream = _make_client("garbage")
+
+        _, reason = await _search(client)
+        assert reason == "unparseable"
+        await asyncio.sleep(0.25)
+        await _search(client)
+        assert client.negative_cache.get_stale(KEY)["failures"] == 2
+
+        # 第二次失败的TTL为0.4秒，0.25秒后仍然命中
+        await asyncio.sleep(0.25)
+        await _search(client)
+        assert upstream.calls == 2
+
+        await asyncio.sleep(0.2)
+        upstream.mode = "ok"
+        trains, reason = await _search(client)
+        assert trains == TRAINS and reason is None and upstream.calls == 3
+        assert client.negative_cache.get_stale(KEY) is None
+        assert client.cache.get(KEY) == TRAINS
+
+    asyncio.run(run())
+    print("✅ TTL随连续失败翻倍，恢复后写入正常缓存")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🧯 失败结果缓存测试")
+    print("=" * 60)
+
+    tests = [
+        test_failure_cached,
+        test_backoff_and_recovery
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+地名规范化测试脚本 - 别名、拼音、英文写法映射到规范名称
+"""
+
+from place_names import PlaceNameIndex
+
+
+def test_builtin_aliases():
+    """测试内置别名表中的城市和车站写法"""
+    print("🔍 测试内置别名表...")
+    index = PlaceNameIndex.from_file()
+
+    for name in ("北京", "北京站", "Beijing", " BEIJING ", "peking"):
+        assert index.canonical(name) == "北京", name
+    for name in ("北京南", "北京南站", "Beijing South", "beijingnan", "ＢｅｉｊｉｎｇＮａｎ"):
+        assert index.canonical(name) == "北京南", name
+    assert index.canonical("济南西站") == "济南西"
+    print("✅ 各种写法归到同一规范名称")
+    return True
+
+
+def test_generated_and_unknown():
+    """测试自动生成的方位别名和未登记名称"""
+    print("\n🔍 测试生成别名和未登记名称...")
+    index = PlaceNameIndex(
+        {"西安": {"pinyin": "xian", "aliases": []}},
+        {"西安北": {"city": "西安"}}
+    )
+
+    assert index.canonical("Xi'an North Railway Station") == "西安北"
+    assert index.canonical("xianbei") == "西安北"
+    assert index.canonical("西安市") == "西安"
+    assert index.canonical("大理站") == "大理"
+    assert index.canonical("") == ""
+
+    stats = index.stats()
+    assert stats["lookups"] == 4 and stats["unknown"] == 1
+    print("✅ 方位别名自动生成，未登记名称只做清洗")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🗺️ 地名规范化测试")
+    print("=" * 60)
+
+    tests = [
+        test_builtin_aliases,
+        test_generated_and_unknown
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
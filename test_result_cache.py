@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+结果缓存测试脚本 - TTL过期、LRU淘汰与软过期刷新
+"""
+
+import time
+
+from llm_cache import ResultCache, make_cache_key
+
+
+def test_ttl_expiry():
+    """测试条目过期后不再命中，但仍可作为降级数据读取"""
+    print("🔍 测试TTL过期...")
+    cache = ResultCache(ttls={"search_trains": 0.05})
+    key = make_cache_key("search_trains", "", "北京", "上海", "2026-10-20")
+    cache.set(key, [{"train_no": "G1"}])
+
+    assert cache.get(key) == [{"train_no": "G1"}]
+    time.sleep(0.1)
+    assert cache.get(key) is None
+    assert cache.get_stale(key) == [{"train_no": "G1"}]
+
+    stats = cache.stats()
+    assert stats["hits"] == {"search_trains": 1} and stats["misses"] == {"search_trains": 1}
+    assert stats["expirations"] == 1
+    print("✅ 过期条目不命中，降级读取仍可用")
+    return True
+
+
+def test_lru_eviction():
+    """测试超出条目数时淘汰最久未使用的条目"""
+    print("\n🔍 测试LRU淘汰...")
+    cache = ResultCache(ttls={}, max_entries=2)
+    first, second, third = (make_cache_key("get_route_stations", train_no) for train_no in ("G1", "G2", "G3"))
+    cache.set(first, {"train_no": "G1"})
+    cache.set(second, {"train_no": "G2"})
+
+    # 读取G1后，最久未使用的是G2
+    assert cache.get(first) is not None
+    cache.set(third, {"train_no": "G3"})
+    assert cache.get(second) is None
+    assert cache.get(first) == {"train_no": "G1"} and cache.get(third) == {"train_no": "G3"}
+    assert cache.stats()["evictions"] == 1
+    print("✅ 淘汰最久未使用的条目")
+    return True
+
+
+def test_returns_copies():
+    """测试调用方修改返回值不会影响缓存内容"""
+    print("\n🔍 测试返回副本...")
+    cache = ResultCache(ttls={})
+    key = make_cache_key("get_route_recommendations", " g1 ", "北京南", "上海虹桥")
+    cache.set(key, {"route_info": {"train_no": "G1"}})
+
+    cache.get(key)["route_info"]["train_no"] = "G2"
+    assert cache.get(make_cache_key("get_route_recommendations", "G1", "北京南", "上海虹桥")) == {"route_info": {"train_no": "G1"}}
+    print("✅ 缓存键规范化，返回值互不影响")
+    return True
+
+
+def test_soft_expiry():
+    """测试软过期后仍然命中，并提示需要后台刷新"""
+    print("\n🔍 测试软过期...")
+    cache = ResultCache(ttls={}, default_ttl=0.2, soft_ratio=0.25, refresh_jitter=0)
+    key = make_cache_key("get_route_bundle", "G1", "北京南", "上海虹桥")
+    cache.set(key, {"train_no": "G1"})
+    assert not cache.needs_refresh(key)
+
+    time.sleep(0.08)
+    assert cache.get(key) == {"train_no": "G1"}
+    assert cache.needs_refresh(key)
+
+    # 重新写入后重新计时
+    cache.set(key, {"train_no": "G1", "refreshed": True})
+    assert not cache.needs_refresh(key)
+    time.sleep(0.25)
+    assert cache.get(key) is None and not cache.needs_refresh(key)
+    print("✅ 软过期命中并需要刷新，硬过期后不再命中")
+    return True
+
+
+def test_backfill_keeps_write_time():
+    """测试从持久化缓存回填时按原写入时间计算软过期，已过期的不回填"""
+    print("\n🔍 测试回填软过期...")
+    cache = ResultCache(ttls={}, default_ttl=100, soft_ratio=0.5, refresh_jitter=0)
+    key = make_cache_key("get_route_stations", "G1")
+
+    # 原条目写入已过去60秒，超过软过期时间50秒
+    cache.set(key, {"train_no": "G1"}, expires_at=time.time() + 40)
+    assert cache.get(key) is not None and cache.needs_refresh(key)
+
+    expired = make_cache_key("get_route_stations", "G2")
+    cache.set(expired, {"train_no": "G2"}, expires_at=time.time() - 1)
+    assert cache.get_stale(expired) is None
+    print("✅ 回填条目保留原来的刷新时间")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🗄️ 结果缓存测试")
+    print("=" * 60)
+
+    tests = [
+        test_ttl_expiry,
+        test_lru_eviction,
+        test_returns_copies,
+        test_soft_expiry,
+        test_backfill_keeps_write_time
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
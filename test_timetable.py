@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+时刻表工具测试脚本 - 区段拼接与区间切片
+"""
+
+from timetable import stitch_segments, slice_timetable
+
+
+def _station(name, arrival, departure, **extra):
+    return {"name": name, "arrival_time": arrival, "departure_time": departure, **extra}
+
+
+def test_stitch_overlap():
+    """测试相邻区段在分界站重叠时的拼接"""
+    print("🔍 测试区段拼接...")
+    first = [
+        _station("北京西站", "始发站", "08:00"),
+        _station("石家庄站", "09:10", "09:12"),
+        _station("郑州东站", "10:30", "终点站")
+    ]
+    second = [
+        _station("郑州东站", "始发站", "10:35"),
+        _station("武汉站", "12:20", "终点站")
+    ]
+
+    stations = stitch_segments([first, second])
+    assert [s["name"] for s in stations] == ["北京西站", "石家庄站", "郑州东站", "武汉站"]
+    assert [s["sequence"] for s in stations] == [1, 2, 3, 4]
+    boundary = stations[2]
+    assert (boundary["arrival_time"], boundary["departure_time"], boundary["stop_duration"]) == ("10:30", "10:35", "5分钟")
+    assert stations[0]["arrival_time"] == "始发站" and stations[-1]["departure_time"] == "终点站"
+    print("✅ 分界站合并且站序连续")
+    return True
+
+
+def test_stitch_mismatch():
+    """测试分界站对不上或区段为空时放弃拼接"""
+    print("\n🔍 测试分界站不一致...")
+    first = [_station("北京西站", "始发站", "08:00"), _station("郑州站", "10:30", "终点站")]
+    second = [_station("郑州东站", "始发站", "10:35"), _station("武汉站", "12:20", "终点站")]
+
+    assert stitch_segments([first, second]) is None
+    assert stitch_segments([first, []]) is None
+    print("✅ 分界站不一致时返回None")
+    return True
+
+
+def test_slice_timetable():
+    """测试从全程时刻表中切出乘车区间"""
+    print("\n🔍 测试区间切片...")
+    stations = [
+        _station("北京南站", "始发站", "08:00", stop_duration="0分钟"),
+        _station("济南西站", "09:30", "09:32", stop_duration="2分钟"),
+        _station("南京南站", "11:40", "11:43", stop_duration="3分钟"),
+        _station("上海虹桥站", "12:50", "终点站", stop_duration="0分钟")
+    ]
+
+    sliced = slice_timetable(stations, "济南西", "南京南站")
+    segment = sliced["stations"]
+    assert [s["name"] for s in segment] == ["济南西站", "南京南站"]
+    assert [s["sequence"] for s in segment] == [1, 2]
+    assert segment[0]["arrival_time"] == "始发站" and segment[-1]["departure_time"] == "终点站"
+    assert sliced["total_time"] == "2小时8分"
+    assert stations[1]["arrival_time"] == "09:30", "切片不应修改原时刻表"
+
+    assert slice_timetable(stations, "南京南", "济南西") is None
+    assert slice_timetable(stations, "北京南", "杭州东") is None
+    print("✅ 区间切片正确，方向相反或站点不存在时返回None")
+    return True
+
+
+def main():
+    """主测试函数"""
+    print("🚄 时刻表工具测试")
+    print("=" * 60)
+
+    tests = [
+        test_stitch_overlap,
+        test_stitch_mismatch,
+        test_slice_timetable
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} 失败: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"📊 测试结果: {passed}/{len(tests)} 通过")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    main()
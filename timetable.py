@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+列车时刻表模块 - 按车次保存全程停靠站，任意上下车站区间由全程时刻表切片得到
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+ORIGIN_ARRIVAL = "始发站"
+TERMINUS_DEPARTURE = "终点站"
+
+
+def _station_key(name: Any) -> str:
+    """站名比较时忽略空白和结尾的“站”字"""
+    name = str(name or "").strip()
+    return name[:-1] if name.endswith("站") and len(name) > 1 else name
+
+
+def find_station(stations: List[Dict[str, Any]], query: str, start: int = 0) -> Optional[int]:
+    """在时刻表中查找站点下标：依次按站名精确匹配、站名前缀、所在城市匹配"""
+    target = _station_key(query)
+    if not target:
+        return None
+    candidates = list(enumerate(stations))[start:]
+    for matches in (
+        lambda s: _station_key(s.get("name")) == target,
+        lambda s: _station_key(s.get("name")).startswith(target),
+        lambda s: str(s.get("city") or "").strip() == target
+    ):
+        for index, station in candidates:
+            if matches(station):
+                return index
+    return None
+
+
+def _minutes(value: Any) -> Optional[int]:
+    """把 HH:MM 转成当天的分钟数"""
+    try:
+        hours, minutes = str(value).strip().split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _format_duration(minutes: int) -> str:
+    hours, minutes = divmod(minutes, 60)
+    if hours and minutes:
+        return f"{hours}小时{minutes}分"
+    return f"{hours}小时" if hours else f"{minutes}分钟"
+
+
+def travel_minutes(stations: List[Dict[str, Any]]) -> Optional[int]:
+    """从第一站发车到最后一站到达的分钟数，时刻倒退时按跨天处理"""
+    previous = _minutes(stations[0].get("departure_time")) if stations else None
+    if previous is None:
+        return None
+    elapsed = 0
+    last = len(stations) - 1
+    for index, station in enumerate(stations[1:], 1):
+        arrival = _minutes(station.get("arrival_time"))
+        if arrival is None:
+            return None
+        elapsed += (arrival - previous) % (24 * 60)
+        previous = arrival
+        departure = _minutes(station.get("departure_time"))
+        if index < last and departure is not None:
+            elapsed += (departure - arrival) % (24 * 60)
+            previous = departure
+    return elapsed
+
+
+def _haversine(a: Dict[str, Any], b: Dict[str, Any]) -> Optional[float]:
+    try:
+        lat1, lng1 = math.radians(float(a["latitude"])), math.radians(float(a["longitude"]))
+        lat2, lng2 = math.radians(float(b["latitude"])), math.radians(float(b["longitude"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(h))
+
+
+def path_distance_km(stations: List[Dict[str, Any]]) -> Optional[float]:
+    """按相邻站点坐标估算的线路长度"""
+    total = 0.0
+    for a, b in zip(stations, stations[1:]):
+        distance = _haversine(a, b)
+        if distance is None:
+            return None
+        total += distance
+    return total
+
+
+def _is_placeholder(value: Any) -> bool:
+    return value in (ORIGIN_ARRIVAL, TERMINUS_DEPARTURE, "-", "", None)
+
+
+def _join_boundary(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """合并相邻区段在分界站的两条记录：到达时刻取前一段，发车时刻取后一段，并重算停车时长"""
+    station = dict(after)
+    station.update({field: value for field, value in before.items() if field not in station or station[field] in (None, "", [])})
+    if not _is_placeholder(before.get("arrival_time")):
+        station["arrival_time"] = before["arrival_time"]
+    if _is_placeholder(station.get("departure_time")) and not _is_placeholder(before.get("departure_time")):
+        station["departure_time"] = before["departure_time"]
+
+    arrival, departure = _minutes(station.get("arrival_time")), _minutes(station.get("departure_time"))
+    if arrival is not None and departure is not None:
+        station["stop_duration"] = f"{(departure - arrival) % (24 * 60)}分钟"
+    return station
+
+
+def stitch_segments(segments: List[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """把按运行顺序排列、两端相互重叠的区段时刻表拼成全程时刻表
+
+    后一段的首站必须出现在已拼接的部分中，丢弃该站之后的重复部分并合并分界站；
+    找不到分界站（如模型把郑州站写成郑州东站）或区段为空时返回None。
+    拼接后重新编号站序，并把全程首站的到达时间和末站的发车时间设为始发站/终点站。
+    """
+    stations: List[Dict[str, Any]] = []
+    for segment in segments:
+        segment = [dict(station) for station in segment if isinstance(station, dict) and station.get("name")]
+        if not segment:
+            return None
+        overlap = None
+        if stations:
+            first = _station_key(segment[0]["name"])
+            for index in range(len(stations) - 1, -1, -1):
+                if _station_key(stations[index].get("name")) == first:
+                    overlap = index
+                    break
+        if stations and overlap is None:
+            return None
+        if overlap is None:
+            stations.extend(segment)
+        else:
+            stations[overlap:] = [_join_boundary(stations[overlap], segment[0])] + segment[1:]
+
+    for sequence, station in enumerate(stations, 1):
+        station["sequence"] = sequence
+    if stations:
+        stations[0]["arrival_time"] = ORIGIN_ARRIVAL
+        stations[-1]["departure_time"] = TERMINUS_DEPARTURE
+    return stations
+
+
+def slice_timetable(
+    stations: List[Dict[str, Any]],
+    from_station: str,
+    to_station: str
+) -> Optional[Dict[str, Any]]:
+    """从全程时刻表中切出上车站到下车站的区间，重排站序并重新计算首末站时刻和区间总计
+
+    任一站点不在时刻表中或方向相反时返回None。
+    """
+    start = find_station(stations, from_station)
+    if start is None:
+        return None
+    end = find_station(stations, to_station, start + 1)
+    if end is None:
+        return None
+
+    segment = [dict(station) for station in stations[start:end + 1]]
+    minutes = travel_minutes(segment)
+    distance = path_distance_km(segment)
+
+    for sequence, station in enumerate(segment, 1):
+        station["sequence"] = sequence
+    segment[0]["arrival_time"] = ORIGIN_ARRIVAL
+    segment[0]["stop_duration"] = "0分钟"
+    segment[-1]["departure_time"] = TERMINUS_DEPARTURE
+    segment[-1]["stop_duration"] = "0分钟"
+
+    return {
+        "stations": segment,
+        "total_time": _format_duration(minutes) if minutes is not None else "",
+        "total_distance": f"约{round(distance)}公里" if distance is not None else ""
+    }